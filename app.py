@@ -1,10 +1,41 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import time
 import io
+import hashlib
+import random
+import tracemalloc
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Optional
+import pyarrow as pa
+import requests
 import gspread
+try:
+    import fcntl
+except ImportError:  # Windows: the publisher lock uses msvcrt byte-range locks instead
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+from gspread.utils import rowcol_to_a1
 from google.oauth2.service_account import Credentials
-from datetime import datetime, timedelta
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from datetime import datetime, timedelta, timezone
+
+# Copy-on-Write (default from pandas 3): selecting rows from the shared
+# snapshot never copies the whole table and can never write back into it
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
 # -------------------------------------------------
 # PAGE CONFIG
@@ -99,6 +130,109 @@ st.markdown(f"""
 # -------------------------------------------------
 MAX_ATTEMPTS = 3
 SESSION_TIMEOUT = 15  # minutes
+REFRESH_INTERVAL = 300  # seconds between background data refreshes (starting value)
+MIN_REFRESH_INTERVAL = 60  # the interval shrinks towards this while the sheet keeps changing
+# ...and grows back towards this while it stays unchanged; an unchanged
+# check is one cheap modifiedTime call, so it never backs off past the old TTL
+MAX_REFRESH_INTERVAL = REFRESH_INTERVAL
+VERIFY_RESPONSE_TIME = 1.5  # seconds from "Verify" to the answer, the same for every outcome
+VERIFY_POLL_INTERVAL = 0.25  # how often a waiting session checks whether its answer is due
+LINE_ITEM_VIEW = "table"  # "table": a page of line items in one element; "cards": an expander per line
+LINE_ITEMS_PAGE_SIZE = 25  # line items per page; larger orders get filter, sort and paging controls
+LINE_ITEM_SORTS = {  # sort choices -> column sorted on (raw values, not display text)
+    "Line order": None,
+    "Product": "Product name",
+    "Item number": "Item number",
+    "Net amount": "Net amount",
+    "Quantity": "Quantity Order",
+    "Requested ship date": "Requested ship date",
+}
+ORDER_CACHE_SIZE = 512  # rendered order payloads kept per process (least recently used evicted)
+ORDER_LINES_CACHE_ROWS = 50_000  # line-item rows the cache may hold in all; larger orders are not cached
+
+# Order data source, chosen with an [order_source] table in secrets:
+#   type = "google_sheet" (default), "file" (CSV or Parquet) or "sqlite"
+#   path = "orders.csv" / "orders.db"; table = "sales_lines" (sqlite only)
+#   worksheets = ["fzap 2025", {name = "fmbl", spreadsheet_key = "...", worksheet = "2025"}]
+#     (google_sheet only; tabs are fetched in parallel and tagged in a Source column,
+#     named after the worksheet and, for another spreadsheet, its key; names must differ)
+DEFAULT_SQLITE_TABLE = "sales_lines"
+SHEETS_MAX_WORKERS = 4  # worksheets downloaded at the same time
+
+# Google Sheets source. Set `sheet_key` in secrets to skip the Drive
+# search by name; otherwise the name is resolved once per process.
+SHEET_NAME = "salesline_chatbot"
+SHEETS_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)  # renew access tokens this long before expiry
+SHEET_FETCH_MODE = "values"  # "values": one column-major grid fetch; "records": legacy get_all_records
+PROFILE_LOADS = False  # trace peak memory of each full download (slows it down)
+PAGE_ROWS = 5000  # sheet lines per range request in a full download
+PAGE_RESUME_WINDOW = 600  # seconds a failed download may resume from its last page
+
+# Transient Google Sheets errors are retried with exponential backoff and
+# full jitter; repeated failed loads open a circuit breaker for a while
+SHEETS_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 1  # seconds, doubled per attempt
+QUOTA_RETRY_BASE_DELAY = 5  # read quota is per minute, so 429s back off harder
+RETRY_MAX_DELAY = 30
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+BREAKER_FAILURE_THRESHOLD = 3  # consecutive failed loads before the circuit opens
+BREAKER_COOLDOWN = 120  # seconds the circuit stays open before one trial load
+
+# Last good sheet snapshot, kept on disk for warm starts and offline fallback.
+# One worker process (the lock holder) reads Google Sheets and publishes
+# numbered Arrow files; the others memory-map whatever the manifest points at.
+SNAPSHOT_DIR = ".snapshot"
+SNAPSHOT_MANIFEST = os.path.join(SNAPSHOT_DIR, "orders.json")
+PUBLISHER_LOCK = os.path.join(SNAPSHOT_DIR, "publisher.lock")
+SNAPSHOT_VERSIONS_KEPT = 3
+SHARED_POLL_INTERVAL = 15  # seconds between manifest checks on non-publishing workers
+
+# Incremental sync: after the first full download only rows whose
+# modifieddatetime moved past the high-water mark (or new recids) are fetched
+DELTA_SYNC = True
+DELTA_MAX_CHANGED_FRACTION = 0.2  # above this share of changed rows, do a full download
+DELTA_MAX_RANGES = 500  # ...or above this many separate runs of changed rows
+DELTA_RANGES_PER_REQUEST = 100  # row ranges per batch_get; they all go in one GET query string
+FULL_SYNC_EVERY = 12  # force a full download every N syncs to heal any drift
+SHEET_DATETIME_FORMAT = "%m/%d/%y %H:%M"  # e.g. "11/4/25 17:39"
+
+# Column types applied once at load time; missing values stay NaN/NaT
+NUMERIC_COLUMNS = ["Net amount", "Unit price", "Quantity", "Quantity Order"]
+DATE_COLUMNS = [
+    "Delivery Date", "Shipping Date", "Requested receipt date", "Requested ship date",
+    "modifieddatetime", "createddatetime",
+]
+DISPLAY_DATE_FORMAT = "%d %b %Y"
+
+# Only the columns the app reads are kept in the snapshot (recid and
+# modifieddatetime identify rows for syncing); repeated labels are categoricals
+SNAPSHOT_COLUMNS = [
+    "recid", "Sales order", "Inventory Unit", "Order Status", "Delivery Date",
+    "Invoice account", "Delivery address Name", "Mode of delivery", "Delivery terms",
+    "Item number", "Net amount", "Product name", "Quantity Order",
+    "Requested receipt date", "Requested ship date", "Unit price", "Unit",
+    "Shipping Date", "modifieddatetime", "Source",
+]
+CATEGORICAL_COLUMNS = [
+    "Inventory Unit", "Order Status", "Mode of delivery", "Delivery terms", "Unit",
+    "Delivery address Name", "Product name", "Source",
+]
+
+# Order-level summary built once per partition: header fields are the first
+# non-missing value among an order's lines
+SUMMARY_HEADER_COLUMNS = [
+    "Order Status", "Delivery Date", "Shipping Date", "Delivery address Name",
+    "Mode of delivery", "Delivery terms",
+]
+
+# Snapshots are split into one partition per business unit, each with its
+# own lookup index; a refresh only touches the index entries of lines
+# (by recid) whose content changed
+PARTITION_COLUMN = "Inventory Unit"
 
 def init_session():
     """Initialize session state variables"""
@@ -108,6 +242,9 @@ def init_session():
         st.session_state.order_id = ""
         st.session_state.attempts = 0
         st.session_state.blocked_until = None
+        st.session_state.pending_verification = None  # lookup result waiting for its reveal time
+        st.session_state.verified_order = None  # payload of the order being shown
+        st.session_state.last_render = None  # elements and bytes sent for the last order shown
         st.session_state.last_activity = datetime.now()
 
 def check_timeout():
@@ -116,46 +253,802 @@ def check_timeout():
         st.session_state.stage = "name"
         st.session_state.customer_name = ""
         st.session_state.order_id = ""
+        st.session_state.verified_order = None
         st.warning(f"⏰ Session timed out after {SESSION_TIMEOUT} minutes of inactivity.")
         return True
     st.session_state.last_activity = datetime.now()
     return False
 
+def read_secret(key, default=None):
+    """st.secrets.get that tolerates a missing secrets.toml"""
+    try:
+        return st.secrets.get(key, default)
+    except FileNotFoundError:
+        return default
+
+
 # -------------------------------------------------
-# LOAD DATA FROM GOOGLE SHEET (OR FALLBACK)
+# GOOGLE SHEETS CONNECTION
 # -------------------------------------------------
-@st.cache_data(ttl=300, show_spinner=False)
-def load_data():
+class SheetsConnection:
+    """
+    Long-lived authorised gspread client and resolved worksheets. A refresh
+    only pays for the values download, not for auth and a Drive search.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._creds = None
+        self._client = None
+        self._worksheets = {}
+
+    def worksheet(self, spreadsheet_key=None, title=None):
+        """
+        The worksheet `title` (default: the first tab) of the spreadsheet
+        `spreadsheet_key` (default: sheet_key from secrets, else SHEET_NAME).
+        """
+        with self._lock:
+            if self._client is None:
+                self._creds = Credentials.from_service_account_info(
+                    st.secrets["gcp_service_account"], scopes=SHEETS_SCOPES
+                )
+                self._client = gspread.authorize(self._creds)
+            self._renew_token()
+
+            cache_key = (spreadsheet_key, title)
+            if cache_key not in self._worksheets:
+                sheet_key = spreadsheet_key or read_secret("sheet_key")
+                if sheet_key:
+                    spreadsheet = self._client.open_by_key(sheet_key)
+                else:
+                    spreadsheet = self._client.open(SHEET_NAME)
+                    print(f"Resolved '{SHEET_NAME}' to key {spreadsheet.id}; set sheet_key to skip the lookup.")
+                self._worksheets[cache_key] = spreadsheet.worksheet(title) if title else spreadsheet.sheet1
+            return self._worksheets[cache_key]
+
+    def reset(self):
+        """Drop the client so the next call authorises and resolves again"""
+        with self._lock:
+            self._creds = None
+            self._client = None
+            self._worksheets = {}
+
+    def _renew_token(self):
+        # google-auth keeps expiry as naive UTC
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        expiry = self._creds.expiry
+        if not self._creds.valid or (expiry is not None and expiry - now < TOKEN_REFRESH_MARGIN):
+            self._creds.refresh(Request())
+
+
+@st.cache_resource
+def get_sheets_connection():
+    """One authorised Sheets connection per process"""
+    return SheetsConnection()
+
+
+def is_auth_error(error):
+    """True for errors that a fresh client or spreadsheet lookup could fix"""
+    if isinstance(error, RefreshError):
+        return True
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code in (401, 403, 404)
+    return False
+
+
+# -------------------------------------------------
+# RETRIES AND CIRCUIT BREAKER
+# -------------------------------------------------
+class CircuitOpenError(Exception):
+    """Raised instead of calling Google Sheets while the circuit is open"""
+
+
+def is_retryable(error):
+    """Quota, server and network errors are worth another try"""
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code in RETRYABLE_STATUS
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def retry_delay(error, attempt):
+    """Exponential backoff with full jitter, honouring Retry-After on quota errors"""
+    base = RETRY_BASE_DELAY
+    if isinstance(error, gspread.exceptions.APIError) and error.response.status_code == 429:
+        base = QUOTA_RETRY_BASE_DELAY
+        retry_after = error.response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(int(retry_after), RETRY_MAX_DELAY)
+    return random.uniform(0, min(base * 2 ** attempt, RETRY_MAX_DELAY))
+
+
+class SheetsGuard:
+    """
+    Retries transient Google Sheets errors and trips a circuit breaker after
+    BREAKER_FAILURE_THRESHOLD consecutive failed loads. While the circuit is
+    open no request is sent; after BREAKER_COOLDOWN one trial load is let
+    through, which closes the circuit again if it succeeds.
+
+    call() only retries; a load, however many worksheets it reads (from
+    pool threads), reports its outcome once through load().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.trips = 0
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= BREAKER_COOLDOWN:
+            return "half-open"
+        return "open"
+
+    def check(self):
+        """Raise CircuitOpenError while the circuit is open"""
+        opened_at = self.opened_at
+        if opened_at is not None and time.monotonic() - opened_at < BREAKER_COOLDOWN:
+            remaining = BREAKER_COOLDOWN - (time.monotonic() - opened_at)
+            raise CircuitOpenError(f"Google Sheets paused after repeated failures; retrying in {remaining:.0f}s")
+
+    def load(self, fn):
+        """Run one whole load and count it as a single success or failure"""
+        self.check()
+        try:
+            result = fn()
+        except CircuitOpenError:
+            raise
+        except Exception:
+            self._record_failure()
+            raise
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+        return result
+
+    def call(self, fn):
+        """Run one Sheets request, retrying transient errors"""
+        self.check()
+        for attempt in range(SHEETS_MAX_ATTEMPTS):
+            try:
+                return fn()
+            except Exception as e:
+                if attempt + 1 < SHEETS_MAX_ATTEMPTS and is_retryable(e):
+                    delay = retry_delay(e, attempt)
+                    with self._lock:
+                        self.retries += 1
+                    print(f"Google Sheets error ({e}); retry {attempt + 1} in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                raise
+
+    def _record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= BREAKER_FAILURE_THRESHOLD:
+                if self.state != "open":
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {"retries": self.retries, "trips": self.trips, "state": self.state}
+
+
+@st.cache_resource
+def get_sheets_guard():
+    """One retry policy and breaker per process"""
+    return SheetsGuard()
+
+
+# -------------------------------------------------
+# INCREMENTAL SYNC FROM GOOGLE SHEET
+# -------------------------------------------------
+@st.cache_resource
+def get_sync_state(spreadsheet_key, worksheet):
+    """
+    Process-wide memory of the last rows pulled from one worksheet, keyed
+    by its spreadsheet key and title (None for the defaults). The cache
+    key is the arguments as passed, so always pass both positionally.
+    """
+    return {
+        "lock": threading.Lock(),
+        "header": None,
+        "records": None,
+        "high_water": None,
+        "syncs_since_full": 0,
+        "last_fetch": {},
+        "raw_bytes": 0,
+        "page_progress": None,
+        "modified_time": None,
+    }
+
+
+def parse_sheet_datetimes(values):
+    """Parse sheet timestamps like '11/4/25 17:39'; blanks become NaT"""
+    return pd.to_datetime(pd.Series(values, dtype=object), format=SHEET_DATETIME_FORMAT, errors="coerce")
+
+
+def sync_sheet(sheet, spreadsheet_key=None, worksheet=None):
+    """
+    Return the sheet contents as a DataFrame, downloading only what changed
+    since the previous sync where possible. Returns None when the
+    spreadsheet has not been modified since the last sync.
+    """
+    state = get_sync_state(spreadsheet_key, worksheet)
+    with state["lock"]:
+        modified_time = sheet_modified_time(sheet)
+        if state["records"] is not None and modified_time is not None and modified_time == state["modified_time"]:
+            print("Google Sheet unchanged since the last sync.")
+            return None
+
+        df = _sync_rows(sheet, state)
+        # Recorded only after a successful sync; an edit made mid-download
+        # just shows up as another change on the next check
+        state["modified_time"] = modified_time
+        return df
+
+
+def sheet_modified_time(sheet):
+    """Drive modifiedTime of the spreadsheet (one small metadata call), or None"""
+    try:
+        return sheet.spreadsheet.get_lastUpdateTime()
+    except Exception as e:
+        print(f"Change check unavailable, syncing anyway: {e}")
+        return None
+
+
+def _sync_rows(sheet, state):
+    """Delta or full download of the sheet rows, depending on the sync state"""
+    header = sheet.row_values(1)
+    needs_full = (
+        not DELTA_SYNC
+        or state["records"] is None
+        or header != state["header"]
+        or "recid" not in header
+        or "modifieddatetime" not in header
+        or state["syncs_since_full"] >= FULL_SYNC_EVERY
+    )
+    if not needs_full:
+        df, fetch_stats = measure_fetch(lambda: _delta_sync(sheet, header, state), mode="delta")
+        if df is not None:
+            state["syncs_since_full"] += 1
+            state["last_fetch"] = dict(fetch_stats, raw_bytes=state["raw_bytes"])
+            return df.copy()
+
+    df, fetch_stats = measure_fetch(lambda: fetch_full_sheet(sheet, header, state))
+    fetch_stats["raw_bytes"] = state["raw_bytes"]
+    state["header"] = header
+    state["records"] = df
+    state["syncs_since_full"] = 0
+    state["last_fetch"] = fetch_stats
+    if "modifieddatetime" in df.columns:
+        state["high_water"] = parse_sheet_datetimes(df["modifieddatetime"]).max()
+    print(f"Google Sheets full sync: {len(df)} rows, {describe_fetch(fetch_stats)}.")
+    return df.copy()
+
+
+def fetch_full_sheet(sheet, header, state):
+    """Download the whole sheet as a DataFrame using SHEET_FETCH_MODE"""
+    if SHEET_FETCH_MODE == "records":
+        df = pd.DataFrame(sheet.get_all_records())
+        state["raw_bytes"] = int(df.memory_usage(index=False, deep=True).sum())
+        return df
+    return fetch_pages(sheet, header, state)
+
+
+def fetch_pages(sheet, header, state):
+    """
+    Page through the sheet PAGE_ROWS lines at a time with column-major range
+    reads, typing each page as it arrives so only one page of raw text is
+    alive at once. Completed pages stay in the sync state, so a download
+    that fails part-way resumes from the next page on the following attempt.
+    The size of the text as downloaded is added up per page into
+    state["raw_bytes"].
+
+    Paging runs to the last row found by sheet_last_row: the API trims
+    trailing blank rows from every range, so a short page does not mean
+    the sheet ended. Wholly blank rows are dropped wherever they fall.
+    """
+    progress = state["page_progress"]
+    if (
+        progress is None
+        or progress["header"] != header
+        or time.monotonic() - progress["started"] > PAGE_RESUME_WINDOW
+    ):
+        progress = {
+            "header": header,
+            "started": time.monotonic(),
+            "next_row": 2,
+            "last_row": sheet_last_row(sheet, header),
+            "pages": [],
+            "raw_bytes": 0,
+        }
+        state["page_progress"] = progress
+    elif progress["pages"]:
+        print(f"Resuming sheet download at row {progress['next_row']}.")
+
+    last_col = rowcol_to_a1(1, len(header))[:-1]
+    while progress["next_row"] <= progress["last_row"]:
+        start = progress["next_row"]
+        end = min(start + PAGE_ROWS - 1, progress["last_row"])
+        columns = sheet.get(f"A{start}:{last_col}{end}", major_dimension="COLUMNS")
+        page = values_to_frame(columns, header)
+        progress["raw_bytes"] += int(page.memory_usage(index=False, deep=True).sum())
+        page = page[(page != "").any(axis=1)]
+        if len(page):
+            progress["pages"].append(type_rows(page))
+        progress["next_row"] = end + 1
+
+    state["page_progress"] = None
+    state["raw_bytes"] = progress["raw_bytes"]
+    pages = progress["pages"]
+    return pd.concat(pages, ignore_index=True) if pages else type_rows(pd.DataFrame(columns=header))
+
+
+def sheet_last_row(sheet, header):
+    """
+    The last sheet row holding data: where the recid column ends (one
+    narrow read), or the worksheet's row_count without a recid column
+    """
+    if "recid" not in header:
+        return sheet.row_count
+    columns = sheet.get(_column_range(header.index("recid") + 1), major_dimension="COLUMNS")
+    return 1 + (len(columns[0]) if columns else 0)
+
+
+def values_to_frame(columns, header):
+    """
+    Build a DataFrame straight from column-major values (no header cells).
+    The API trims trailing blanks, so short or missing columns are padded.
+    """
+    row_count = max((len(col) for col in columns), default=0)
+    columns = list(columns) + [[]] * (len(header) - len(columns))
+    return pd.DataFrame({
+        name: list(col) + [""] * (row_count - len(col))
+        for name, col in zip(header, columns)
+    })
+
+
+def measure_fetch(fetch, mode=None):
+    """Run fetch() and return (result, stats) with wall time and, if profiling, peak memory"""
+    profiling = PROFILE_LOADS and not tracemalloc.is_tracing()
+    if profiling:
+        tracemalloc.start()
+    started = time.perf_counter()
     try:
-        creds = Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"],
-            scopes=[
-                "https://www.googleapis.com/auth/spreadsheets",
-                "https://www.googleapis.com/auth/drive"
-            ]
+        result = fetch()
+    finally:
+        stats = {"mode": mode or SHEET_FETCH_MODE, "seconds": time.perf_counter() - started}
+        if profiling:
+            stats["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return result, stats
+
+
+def describe_fetch(stats):
+    text = f"{stats['mode']} fetch {stats['seconds']:.2f}s"
+    if "peak_bytes" in stats:
+        text += f", peak {stats['peak_bytes'] / 1e6:.1f} MB"
+    return text
+
+
+def _column_range(col, first_row=2):
+    """A1 range covering one whole column from first_row down, e.g. 'A2:A'"""
+    letter = rowcol_to_a1(1, col)[:-1]
+    return f"{letter}{first_row}:{letter}"
+
+
+def _row_runs(rows):
+    """Group sorted sheet row numbers into contiguous (start, end) runs"""
+    runs = []
+    for row in rows:
+        if runs and row == runs[-1][1] + 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return runs
+
+
+def _delta_sync(sheet, header, state):
+    """
+    Fetch only the recid and modifieddatetime columns, then download the rows
+    that are new or modified after the high-water mark and upsert them by recid.
+    Returns None when a full download is cheaper.
+    """
+    recid_range = _column_range(header.index("recid") + 1)
+    modified_range = _column_range(header.index("modifieddatetime") + 1)
+    recid_values, modified_values = sheet.batch_get([recid_range, modified_range])
+
+    row_count = max(len(recid_values), len(modified_values))
+    recids = [str(row[0]) if row else "" for row in recid_values]
+    recids += [""] * (row_count - len(recids))
+    modified = [row[0] if row else "" for row in modified_values]
+    modified += [""] * (row_count - len(modified))
+    modified = parse_sheet_datetimes(modified)
+
+    # Upserts need every row to carry a unique recid
+    if "" in recids or len(set(recids)) != len(recids):
+        return None
+
+    records = state["records"]
+    known = records["recid"].astype(str)
+    high_water = state["high_water"]
+
+    is_new = ~pd.Series(recids).isin(known)
+    is_modified = modified >= high_water if pd.notna(high_water) else pd.Series(True, index=modified.index)
+    changed = (is_new | is_modified).to_numpy()
+    changed_rows = [i + 2 for i in range(row_count) if changed[i]]
+
+    if len(changed_rows) > DELTA_MAX_CHANGED_FRACTION * max(len(records), 1):
+        return None
+    # Scattered edits make many small ranges; past a point the paged full
+    # download is fewer requests
+    runs = _row_runs(changed_rows)
+    if len(runs) > DELTA_MAX_RANGES:
+        return None
+
+    raw_bytes = 0
+    fresh = pd.DataFrame(columns=header)
+    if changed_rows:
+        last_col = rowcol_to_a1(1, len(header))[:-1]
+        ranges = [f"A{start}:{last_col}{end}" for start, end in runs]
+        values = [
+            row
+            for i in range(0, len(ranges), DELTA_RANGES_PER_REQUEST)
+            for block in sheet.batch_get(ranges[i:i + DELTA_RANGES_PER_REQUEST])
+            for row in block
+        ]
+        values = [row + [""] * (len(header) - len(row)) for row in values]
+        fresh = pd.DataFrame(values, columns=header)
+        raw_bytes += int(fresh.memory_usage(index=False, deep=True).sum())
+        fresh = type_rows(fresh)
+
+    # Upsert by recid, then put rows back in sheet order (drops deleted recids)
+    fresh_ids = set(fresh["recid"].astype(str))
+    kept = records[~known.isin(fresh_ids)]
+    merged = pd.concat([kept, fresh], ignore_index=True) if len(fresh) else kept.copy()
+    merged.index = merged["recid"].astype(str)
+    sheet_order = [recid for recid in recids if recid in merged.index]
+    merged = merged.loc[sheet_order].reset_index(drop=True)
+
+    state["records"] = merged
+    state["raw_bytes"] = raw_bytes
+    if modified.notna().any():
+        state["high_water"] = modified.max()
+    removed = len(set(known) - set(recids))
+    print(f"Google Sheets delta sync: {len(fresh)} changed, {removed} removed.")
+    return merged
+
+
+# -------------------------------------------------
+# ORDER DATA SOURCES
+# -------------------------------------------------
+class OrderSource:
+    """
+    Where the order lines come from. fetch() returns the raw rows as a
+    DataFrame, or None when nothing changed since the previous fetch, and
+    raises when the source cannot be read. Typing, indexing and publishing
+    are the same for every source.
+    """
+
+    label = "Order source"
+
+    def __init__(self):
+        self.last_fetch = {}
+
+    def fetch(self):
+        raise NotImplementedError
+
+
+class GoogleSheetSource(OrderSource):
+    """
+    The salesline_chatbot Google Sheet, synced incrementally. With several
+    worksheets configured, they are synced in parallel on a bounded thread
+    pool and concatenated with a Source column naming the tab.
+    """
+
+    label = "Google Sheets"
+
+    def __init__(self, worksheets=()):
+        super().__init__()
+        self.tabs = []
+        for tab in worksheets:
+            if isinstance(tab, str):
+                tab = {"worksheet": tab}
+            key, title = tab.get("spreadsheet_key"), tab.get("worksheet")
+            default_name = " / ".join(part for part in (key, title) if part) or "default"
+            self.tabs.append({"name": tab.get("name") or default_name, "spreadsheet_key": key, "worksheet": title})
+
+        # Names tag the rows in the Source column, and the sync state is per
+        # worksheet, so neither may be shared
+        names = [tab["name"] for tab in self.tabs]
+        sheets = [(tab["spreadsheet_key"], tab["worksheet"]) for tab in self.tabs]
+        if len(set(names)) != len(names) or len(set(sheets)) != len(sheets):
+            raise ValueError(f"order_source worksheets must be distinct and have distinct names: {names}")
+
+    def fetch(self):
+        return get_sheets_guard().load(self._fetch_tabs)
+
+    def _fetch_tabs(self):
+        if not self.tabs:
+            tab = {"name": "", "spreadsheet_key": None, "worksheet": None}
+            df = self._sync_tab(tab)
+            self.last_fetch = tab_sync_state(tab)["last_fetch"]
+            return df
+
+        started = time.perf_counter()
+        timings = {}
+
+        def sync_timed(tab):
+            tab_started = time.perf_counter()
+            try:
+                return self._sync_tab(tab)
+            finally:
+                timings[tab["name"]] = time.perf_counter() - tab_started
+
+        with ThreadPoolExecutor(max_workers=min(SHEETS_MAX_WORKERS, len(self.tabs))) as pool:
+            results = list(pool.map(sync_timed, self.tabs))
+
+        print("Worksheet sync times: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+        raw_bytes = sum(
+            tab_sync_state(tab)["last_fetch"].get("raw_bytes", 0)
+            for tab, df in zip(self.tabs, results)
+            if df is not None
         )
-        gc = gspread.authorize(creds)
+        self.last_fetch = {
+            "mode": SHEET_FETCH_MODE,
+            "seconds": time.perf_counter() - started,
+            "sources": timings,
+            "raw_bytes": raw_bytes,
+        }
+        if all(df is None for df in results):
+            return None
+
+        frames = []
+        for tab, df in zip(self.tabs, results):
+            if df is None:
+                df = tab_sync_state(tab)["records"]  # unchanged tab: reuse its last rows
+            frames.append(df.assign(Source=tab["name"]))
+        return pd.concat(frames, ignore_index=True)
+
+    def _sync_tab(self, tab):
+        connection = get_sheets_connection()
+        try:
+            return get_sheets_guard().call(
+                lambda: sync_sheet(
+                    connection.worksheet(tab["spreadsheet_key"], tab["worksheet"]),
+                    tab["spreadsheet_key"],
+                    tab["worksheet"],
+                )
+            )
+        except Exception as e:
+            if is_auth_error(e):
+                connection.reset()
+            raise
+
+
+def tab_sync_state(tab):
+    return get_sync_state(tab["spreadsheet_key"], tab["worksheet"])
+
+
+class FileSource(OrderSource):
+    """A local CSV or Parquet file with the same columns as the sheet"""
+
+    label = "Order file"
 
-        SHEET_NAME = "salesline_chatbot"
-        sheet = gc.open(SHEET_NAME).sheet1
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._mtime = None
 
-        data = sheet.get_all_records()
-        df = pd.DataFrame(data)
+    def fetch(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return None
+        if self.path.endswith(".parquet"):
+            read = lambda: pd.read_parquet(self.path)
+        else:
+            # Text in, like the sheet's values; apply_schema does the typing
+            read = lambda: pd.read_csv(self.path, dtype=str, keep_default_na=False)
+        df, self.last_fetch = measure_fetch(read, mode="file")
+        self._mtime = mtime
+        return df
 
-        print("Google Sheets loaded successfully.")
 
+class SQLiteSource(OrderSource):
+    """One table of a local SQLite database, opened read-only per fetch"""
+
+    label = "Order database"
+
+    def __init__(self, path, table=DEFAULT_SQLITE_TABLE):
+        super().__init__()
+        self.path = path
+        self.table = table
+        self._mtime = None
+
+    def fetch(self):
+        # Writes in WAL mode land in the -wal file first
+        wal_path = f"{self.path}-wal"
+        mtime = (os.path.getmtime(self.path), os.path.getmtime(wal_path) if os.path.exists(wal_path) else None)
+        if mtime == self._mtime:
+            return None
+
+        def read():
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            try:
+                return pd.read_sql_query(f'SELECT * FROM "{self.table}"', conn)
+            finally:
+                conn.close()
+
+        df, self.last_fetch = measure_fetch(read, mode="sqlite")
+        self._mtime = mtime
+        return df
+
+
+@st.cache_resource
+def get_order_source():
+    """The order source configured under [order_source] in secrets"""
+    config = read_secret("order_source", {})
+    kind = config.get("type", "google_sheet")
+    if kind == "file":
+        return FileSource(config["path"])
+    if kind == "sqlite":
+        return SQLiteSource(config["path"], config.get("table", DEFAULT_SQLITE_TABLE))
+    if kind != "google_sheet":
+        raise ValueError(f"Unknown order_source type: {kind!r}")
+    return GoogleSheetSource(config.get("worksheets", []))
+
+
+# -------------------------------------------------
+# LOAD DATA FROM ORDER SOURCE (OR FALLBACK)
+# -------------------------------------------------
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    One immutable, versioned copy of the order data and its lookup indexes.
+    Every session shares the same object; nothing is copied per rerun.
+    `df` is ordered by partition and each partition's frame is a view of it.
+    """
+    df: pd.DataFrame
+    partitions: dict  # partition key -> Partition
+    routes: dict  # sales order -> keys of the partitions holding its lines
+    loaded_at: datetime
+    source: str = "live"  # "live" (order source), "shared" (another worker's), "disk" (saved) or "embedded" (demo rows)
+    error: Optional[str] = None  # set when the order source could not be reached
+    version: int = 0  # published file version, the same in every worker
+    stats: dict = field(default_factory=dict)
+    # Process-local, always increasing (even when publishing fails); kept
+    # by replace(), so it only changes when the data does
+    generation: int = field(default_factory=time.monotonic_ns)
+
+    @property
+    def stale(self):
+        """True while this is served because the last refresh failed"""
+        return self.error is not None
+
+    @property
+    def content_digest(self):
+        """Hash of the rows as fetched from the order source, if known"""
+        return self.stats.get("content_digest")
+
+    def order_digest(self, order):
+        """
+        Content hash of one sales order's lines, or None if it does not
+        exist. It only changes when those lines do, whatever the version.
+        """
+        keys = self.routes.get(order)
+        if not keys:
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        for key in keys:
+            partition = self.partitions[key]
+            row_keys = np.concatenate(list(partition.order_index.get(order).values()))
+            positions = np.sort(partition.rows.get_indexer(row_keys))
+            digest.update(partition.row_hashes[positions].tobytes())
+        return digest.hexdigest()
+
+    def order_summary(self, order, invoice):
+        """
+        The precomputed summary of one order for one invoice account, as a
+        dict (see build_order_summary), or None if there is no such order.
+        """
+        rows = [
+            partition.summary.loc[(order, invoice)]
+            for partition in (self.partitions[key] for key in self.routes.get(order, ()))
+            if (order, invoice) in partition.summary.index
+        ]
+        if not rows:
+            return None
+
+        summary = {"Sales order": order, "Invoice account": invoice, **rows[0].to_dict()}
+        summary["statuses"] = status_tuple(summary.get("statuses"))
+        for row in rows[1:]:  # the order's lines span business units
+            summary["line_count"] += row["line_count"]
+            # Only the columns the source has were aggregated
+            for cols, merge in [
+                (("net_amount", "quantity"), lambda values: values.sum(min_count=1)),
+                (("first_delivery", "first_ship"), pd.Series.min),
+                (("last_delivery", "last_ship"), pd.Series.max),
+            ]:
+                for col in cols:
+                    if col in summary:
+                        summary[col] = merge(pd.Series([summary[col], row[col]]))
+            summary["statuses"] += tuple(
+                s for s in status_tuple(row.get("statuses")) if s not in summary["statuses"]
+            )
+        return summary
+
+
+def status_tuple(statuses):
+    return statuses if isinstance(statuses, tuple) else ()
+
+
+# Better sources win; a refresh never downgrades the snapshot being served
+SOURCE_RANK = {"embedded": 0, "disk": 1, "shared": 2, "live": 2}
+
+
+def load_data(previous=None, publish=True):
+    """
+    Fetch the order snapshot from the configured source. Returns None when
+    it is unchanged; raises when it cannot be reached (see load_fallback_data).
+    Partitions that match `previous` keep their lookup indexes. Only the
+    worker holding the publisher lock passes publish=True.
+    """
+    source = get_order_source()
+    df = source.fetch()
+    if df is None:
+        return None  # unchanged: keep serving the current snapshot and its caches
+
+    # Rows identical to the current snapshot's keep its version, indexes and caches
+    digest = hash_rows(df)[1]
+    if previous is not None and previous.content_digest == digest:
+        print(f"{source.label} unchanged (content hash matches v{previous.version}).")
+        if previous.source == "live":
+            return None
+        return replace(previous, source="live", loaded_at=datetime.now(), error=None)
+
+    print(f"{source.label} loaded successfully.")
+    snapshot = prepare_snapshot(df, "live", datetime.now(), fetch_stats=source.last_fetch, previous=previous)
+    snapshot = replace(snapshot, stats=dict(snapshot.stats, content_digest=digest))
+    if not publish:
+        return snapshot
+    try:
+        snapshot = replace(snapshot, version=publish_snapshot(snapshot.df, digest))
     except Exception as e:
-        st.error(f"Google Sheets connection failed: {e}")
-        st.warning("Using embedded fallback data — Google Sheet not connected yet.")
+        print(f"Could not publish snapshot to {SNAPSHOT_DIR}: {e}")
+
+    return snapshot
 
-        DATA_CSV_STRING = """recid,Sales order,Inventory Unit,Order Status,Delivery Date,Invoice account,Delivery address Name,Mode of delivery,Delivery terms,Item number,Net amount,Product name,Quantity Order,Requested receipt date,Requested ship date,Unit price,Quantity,Unit,Shipping Date,modifieddatetime,modifiedby,createddatetime,createdby
+
+def load_fallback_data(error):
+    """The last saved snapshot, or the embedded demo rows if nothing was ever saved"""
+    saved = load_published_snapshot("disk", error=error)
+    if saved is not None:
+        return saved
+
+    DATA_CSV_STRING = """recid,Sales order,Inventory Unit,Order Status,Delivery Date,Invoice account,Delivery address Name,Mode of delivery,Delivery terms,Item number,Net amount,Product name,Quantity Order,Requested receipt date,Requested ship date,Unit price,Quantity,Unit,Shipping Date,modifieddatetime,modifiedby,createddatetime,createdby
 5637945894,SAP0014689,fzap,Open Order,11/4/25 0:00,C28402-B0,HONEYWELL FLOUR MILLS PLC,Self -30 T,Ex works,P008966,24407627.3,WHEAT; TYPE CANADIAN RED WINTER; RAW-MATERIAL.,35000,11/4/25 0:00,11/4/25 0:00,697360.78,35,T,11/4/25 0:00,11/4/25 17:39,Iekwuazi,11/4/25 17:33,Iekwuazi
 5637945893,SAP0014688,fzap,Open Order,11/4/25 0:00,C28402-B0,HONEYWELL FLOUR MILLS PLC,Self -30 T,Ex works,P008966,24407627.3,WHEAT; TYPE CANADIAN RED WINTER; RAW-MATERIAL.,35000,11/4/25 0:00,11/4/25 0:00,697360.78,35,T,11/4/25 0:00,11/4/25 17:37,Iekwuazi,11/4/25 17:31,Iekwuazi
 5637945892,SAP0014687,fzap,Open Order,11/4/25 0:00,C28402-B0,HONEYWELL FLOUR MILLS PLC,Self -30 T,Ex works,P008966,24407627.3,WHEAT; TYPE CANADIAN RED WINTER; RAW-MATERIAL.,35000,11/4/25 0:00,11/4/25 0:00,697360.78,35,T,11/4/25 0:00,11/4/25 17:36,Iekwuazi,11/4/25 17:29,Iekwuazi"""
-        
-        df = pd.read_csv(io.StringIO(DATA_CSV_STRING))
 
-    df = df.fillna("N/A")
+    df = pd.read_csv(io.StringIO(DATA_CSV_STRING))
+    return prepare_snapshot(df, "embedded", datetime.now(), error)
+
+
+def prepare_snapshot(df, source, loaded_at, error=None, fetch_stats=None, previous=None):
+    """
+    Normalise and type the raw order rows, then build the partitioned lookup
+    indexes. Sources that type rows as they download (the Google Sheet)
+    report the size of the text they read in fetch_stats["raw_bytes"].
+    """
+    if fetch_stats and "raw_bytes" in fetch_stats:
+        raw_bytes = fetch_stats["raw_bytes"]
+    else:
+        raw_bytes = df.memory_usage(deep=True).sum()
+    df = type_rows(df)
 
     if "Sales order" in df.columns:
         df["Sales order"] = df["Sales order"].astype(str).str.strip().str.upper()
@@ -163,101 +1056,1137 @@ def load_data():
     if "Invoice account" in df.columns:
         df["Invoice account"] = df["Invoice account"].astype(str).str.strip().str.upper()
 
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
+    stats = {"raw_bytes": int(raw_bytes), "memory_bytes": int(df.memory_usage(deep=True).sum())}
+    if fetch_stats:
+        stats["fetch"] = fetch_stats
+    print(
+        f"Snapshot memory: {stats['memory_bytes'] / 1e6:.1f} MB "
+        f"(raw rows read {stats['raw_bytes'] / 1e6:.1f} MB, {len(df)} lines)"
+    )
+    return build_snapshot(df, loaded_at, source, error, stats=stats, previous=previous)
+
+
+def type_rows(df):
+    """Keep the snapshot columns and apply the schema (safe to repeat)"""
+    return apply_schema(df[[col for col in SNAPSHOT_COLUMNS if col in df.columns]])
+
+
+def apply_schema(df):
+    """
+    Parse the numeric columns to float64 and the sheet date columns to
+    datetime64 so nothing needs converting at render time.
+    """
+    df = df.copy()
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns and not pd.api.types.is_float_dtype(df[col]):
+            values = df[col]
+            if not pd.api.types.is_numeric_dtype(values):
+                values = values.astype(str).str.replace(",", "", regex=False)
+            df[col] = pd.to_numeric(values, errors="coerce").astype("float64")
+
+    for col in DATE_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = parse_sheet_datetimes(df[col])
+
     return df
 
 
+# -------------------------------------------------
+# SHARED SNAPSHOT FILES (ARROW IPC, MEMORY-MAPPED)
+# -------------------------------------------------
+# Strings stay in the mapped Arrow buffers instead of becoming Python objects
+ARROW_TYPES_MAPPER = {
+    pa.string(): pd.StringDtype("pyarrow"),
+    pa.large_string(): pd.StringDtype("pyarrow"),
+}.get
+
+
+def read_manifest():
+    """Return the published snapshot manifest, or None if nothing is published yet"""
+    try:
+        with open(SNAPSHOT_MANIFEST) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def publish_snapshot(df, content_digest=None):
+    """
+    Write the prepared frame as the next numbered Arrow IPC file, then
+    atomically point the manifest at it. Returns the new version number.
+    `content_digest` (the raw rows' hash) is kept in the manifest so a
+    restarted worker can still tell when a fetch changed nothing.
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    manifest = read_manifest()
+    version = (manifest["version"] if manifest else 0) + 1
+    filename = f"orders-{version}.arrow"
+
+    # Sheet columns can mix numbers and text; Arrow needs one type per column
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # Per-process temp names: a crashed or overlapping writer never
+    # clobbers another's half-written file
+    tmp_path = os.path.join(SNAPSHOT_DIR, f"{filename}.{os.getpid()}.tmp")
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, os.path.join(SNAPSHOT_DIR, filename))
+
+    manifest = {
+        "version": version,
+        "file": filename,
+        "saved_at": datetime.now().isoformat(),
+        "content_digest": content_digest,
+    }
+    tmp_manifest = f"{SNAPSHOT_MANIFEST}.{os.getpid()}.tmp"
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, SNAPSHOT_MANIFEST)
+
+    # Workers still mapping an older file keep it readable after the unlink
+    for name in os.listdir(SNAPSHOT_DIR):
+        if name.startswith("orders-") and name.endswith(".arrow"):
+            old_version = int(name[len("orders-"):-len(".arrow")])
+            if old_version <= version - SNAPSHOT_VERSIONS_KEPT:
+                os.remove(os.path.join(SNAPSHOT_DIR, name))
+
+    return version
+
+
+def load_published_snapshot(source, error=None, manifest=None, previous=None):
+    """
+    Memory-map the published snapshot file without copying it into this
+    process. Returns a Snapshot, or None when there is no readable file.
+    """
+    manifest = manifest or read_manifest()
+    if manifest is None:
+        return None
+
+    path = os.path.join(SNAPSHOT_DIR, manifest["file"])
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    except (OSError, pa.ArrowInvalid) as e:
+        print(f"Could not read snapshot {path}: {e}")
+        return None
+
+    df = table.to_pandas(split_blocks=True, types_mapper=ARROW_TYPES_MAPPER)
+    saved_at = datetime.fromisoformat(manifest["saved_at"])
+    stats = {
+        "memory_bytes": int(df.memory_usage(deep=True).sum()),
+        "content_digest": manifest.get("content_digest"),
+    }
+    return build_snapshot(df, saved_at, source, error, manifest["version"], stats, previous)
+
+
+class PublisherLock:
+    """
+    Advisory file lock electing the one worker process that reads Google
+    Sheets. It is held for the life of the process and released by the OS
+    if the process dies, so another worker takes over on its next poll.
+    Uses flock, or msvcrt byte-range locks on Windows; with neither, no
+    process is elected and none publishes.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._fd = None
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def acquire(self):
+        if self._fd is not None:
+            return True
+        if fcntl is None and msvcrt is None:
+            return False
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+
+# -------------------------------------------------
+# PARTITIONED ORDER INDEXES
+# -------------------------------------------------
+class OrderIndex:
+    """
+    Sales order -> {invoice account -> array of row keys}, maintained row
+    by row. Row keys are recids, or row positions when a partition has no
+    usable recid. apply() returns a new index and leaves this one untouched,
+    since the snapshot holding it may still be serving lookups; only the
+    orders a change touches are copied. There is no per-line reverse map:
+    the caller reads the old entries of changed lines from the old frame.
+    """
+
+    def __init__(self, orders=None):
+        self._orders = orders if orders is not None else {}
+
+    @classmethod
+    def build(cls, rows, df):
+        """Index every row of a partition, keyed by the matching entry of `rows`"""
+        if df.empty or "Sales order" not in df.columns or "Invoice account" not in df.columns:
+            return cls()
+
+        # One stable sort of (order, invoice) codes; each group's keys are
+        # a slice of the sorted key array rather than Python objects per line
+        order_codes, order_names = pd.factorize(df["Sales order"])
+        invoice_codes, invoice_names = pd.factorize(df["Invoice account"])
+        valid = np.flatnonzero((order_codes >= 0) & (invoice_codes >= 0))
+        groups = order_codes[valid].astype(np.int64) * len(invoice_names) + invoice_codes[valid]
+        ordering = np.argsort(groups, kind="stable")
+        groups = groups[ordering]
+        keys = rows.to_numpy()[valid[ordering]]
+        bounds = np.append(np.flatnonzero(np.diff(groups, prepend=-1)), len(groups))
+
+        orders = {}
+        order_names, invoice_names = order_names.tolist(), invoice_names.tolist()
+        for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            order, invoice = divmod(int(groups[start]), len(invoice_names))
+            orders.setdefault(order_names[order], {})[invoice_names[invoice]] = keys[start:stop]
+        return cls(orders)
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __iter__(self):
+        return iter(self._orders)
+
+    def get(self, order):
+        """{invoice account: row keys} for an order, or None"""
+        return self._orders.get(order)
+
+    def apply(self, upserts=(), deletes=()):
+        """
+        Return (index, added orders, removed orders) after removing the
+        (row key, order, invoice) entries in `deletes`, then adding those
+        in `upserts`. A line that moved is in both.
+        """
+        orders = dict(self._orders)
+        touched = {}
+
+        def invoices_of(order):
+            if order not in touched:
+                touched[order] = dict(orders.get(order, {}))
+            return touched[order]
+
+        for (order, invoice), keys in group_entries(deletes).items():
+            invoices = invoices_of(order)
+            rows = invoices.get(invoice)
+            if rows is None:
+                continue
+            rows = rows[~np.isin(rows, keys)]
+            if len(rows):
+                invoices[invoice] = rows
+            else:
+                del invoices[invoice]
+
+        for (order, invoice), keys in group_entries(upserts).items():
+            invoices = invoices_of(order)
+            rows = invoices.get(invoice)
+            invoices[invoice] = keys if rows is None else np.concatenate([rows, keys])
+
+        for order, invoices in touched.items():
+            if invoices:
+                orders[order] = invoices
+            else:
+                orders.pop(order, None)
+
+        added = [order for order in touched if order in orders and order not in self._orders]
+        removed = [order for order in touched if order not in orders and order in self._orders]
+        return OrderIndex(orders), added, removed
+
+
+def group_entries(entries):
+    """(row key, order, invoice) entries -> {(order, invoice): array of row keys}, skipping blanks"""
+    grouped = {}
+    for key, order, invoice in entries:
+        if not (pd.isna(order) or pd.isna(invoice)):
+            grouped.setdefault((order, invoice), []).append(key)
+    return {group: pd.Index(keys).to_numpy() for group, keys in grouped.items()}
+
+
+@dataclass(frozen=True)
+class Partition:
+    """The order lines of one business unit with their own lookup index"""
+    key: str
+    df: pd.DataFrame
+    order_index: OrderIndex
+    summary: pd.DataFrame  # one row per (sales order, invoice account)
+    rows: pd.Index  # row key of each line: recids, or positions without them
+    row_hashes: np.ndarray  # content hash of each line
+    digest: str  # content hash of the partition's rows
+    loaded_at: datetime  # when this partition's rows last changed
+
+    @property
+    def keyed_by_recid(self):
+        return self.rows.name == "recid"
+
+    def lines(self, row_keys):
+        """The partition's lines for some row keys, in partition order"""
+        positions = np.sort(self.rows.get_indexer(row_keys))
+        return self.df.iloc[positions]
+
+
+def build_snapshot(df, loaded_at, source, error=None, version=0, stats=None, previous=None):
+    """
+    Order the frame by PARTITION_COLUMN and cut it into per-unit partitions.
+    Against `previous`, a partition whose rows hash the same keeps its index,
+    a partition with a few changed lines has just those lines applied to its
+    index by recid, and partitions that disappeared are dropped.
+    """
+    df, slices = partition_slices(df)
+    previous_partitions = previous.partitions if previous is not None else {}
+    routes = dict(previous.routes) if previous is not None else {}
+
+    partitions = {}
+    counts = {"reused": 0, "updated": 0, "rebuilt": 0, "rows_applied": 0}
+    for key, (start, stop) in slices.items():
+        part_df = df.iloc[start:stop]
+        old = previous_partitions.get(key)
+        partition, added, removed, applied = build_partition(key, part_df, loaded_at, old)
+        partitions[key] = partition
+        for order in removed:
+            route(routes, order, key, False)
+        for order in added:
+            route(routes, order, key, True)
+        if old is not None and partition.digest == old.digest:
+            counts["reused"] += 1
+        elif applied is None:
+            counts["rebuilt"] += 1
+        else:
+            counts["updated"] += 1
+            counts["rows_applied"] += applied
+
+    evicted = [key for key in previous_partitions if key not in partitions]
+    for key in evicted:
+        for order in previous_partitions[key].order_index:
+            route(routes, order, key, False)
+
+    if previous is not None:
+        print(
+            f"Partitions: {counts['rebuilt']} rebuilt, {counts['updated']} updated "
+            f"({counts['rows_applied']} lines), {counts['reused']} reused, {len(evicted)} evicted."
+        )
+
+    stats = dict(
+        stats or {},
+        partitions=len(partitions),
+        partitions_rebuilt=counts["rebuilt"],
+        partitions_updated=counts["updated"],
+        index_rows_applied=counts["rows_applied"],
+    )
+    return Snapshot(df, partitions, routes, loaded_at, source, error, version, stats)
+
+
+def build_partition(key, df, loaded_at, old=None):
+    """
+    Return (partition, orders added, orders removed, lines applied) for one
+    unit's rows. Lines applied is None when the index was built from scratch.
+    """
+    rows = partition_rows(df)
+    row_hashes, digest = hash_rows(df)
+
+    if old is not None and old.digest == digest:
+        # Same lines in the same order; keep the old row keys and their lookup table
+        return Partition(
+            key, df, old.order_index, old.summary, old.rows, old.row_hashes, digest, old.loaded_at
+        ), [], [], 0
+
+    summary = build_order_summary(df)
+    if old is None or not (old.keyed_by_recid and rows.name == "recid"):
+        index = OrderIndex.build(rows, df)
+        removed = list(old.order_index) if old is not None else []
+        return Partition(key, df, index, summary, rows, row_hashes, digest, loaded_at), list(index), removed, None
+
+    # Diff the lines by recid and apply only the ones that changed
+    previous_positions = old.rows.get_indexer(rows)
+    changed = (previous_positions < 0) | (old.row_hashes[previous_positions] != row_hashes)
+    gone = np.ones(len(old.rows), dtype=bool)
+    gone[previous_positions[previous_positions >= 0]] = False
+    # The old entries of deleted and changed lines come from the old frame
+    stale = np.concatenate([np.flatnonzero(gone), previous_positions[changed & (previous_positions >= 0)]])
+    stale_lines = old.df.iloc[stale]
+    deletes = zip(old.rows[stale], stale_lines["Sales order"], stale_lines["Invoice account"])
+    changed_lines = df.iloc[np.flatnonzero(changed)]
+    upserts = zip(rows[changed], changed_lines["Sales order"], changed_lines["Invoice account"])
+    index, added, removed = old.order_index.apply(upserts, deletes)
+    applied = int(changed.sum()) + int(gone.sum())
+    return Partition(key, df, index, summary, rows, row_hashes, digest, loaded_at), added, removed, applied
+
+
+def build_order_summary(df):
+    """
+    One vectorised groupby over a partition giving, per (sales order,
+    invoice account): line_count, net_amount, quantity, first/last delivery
+    and ship dates, the distinct statuses and the order header fields.
+    """
+    keys = ["Sales order", "Invoice account"]
+    if df.empty or not all(col in df.columns for col in keys):
+        return pd.DataFrame(index=pd.MultiIndex.from_tuples([], names=keys))
+
+    aggregations = {"line_count": ("Sales order", "size")}
+    for name, col, how in [
+        ("net_amount", "Net amount", "sum"),
+        ("quantity", "Quantity Order", "sum"),
+        ("first_delivery", "Delivery Date", "min"),
+        ("last_delivery", "Delivery Date", "max"),
+        ("first_ship", "Shipping Date", "min"),
+        ("last_ship", "Shipping Date", "max"),
+    ]:
+        if col in df.columns:
+            aggregations[name] = (col, how)
+    for col in SUMMARY_HEADER_COLUMNS:
+        if col in df.columns:
+            aggregations[col] = (col, "first")
+
+    groups = df.groupby(keys, sort=False, observed=True)
+    summary = groups.agg(**aggregations)
+    for col in ["net_amount", "quantity"]:
+        if col in summary.columns:
+            summary[col] = summary[col].where(groups[aggregations[col][0]].count() > 0)  # all missing -> NaN, not 0
+
+    if "Order Status" in df.columns:
+        # Most orders have one status, which "first" already gives; only the
+        # few with several are grouped into tuples
+        distinct = df[keys + ["Order Status"]].dropna().drop_duplicates()
+        several = distinct.groupby(keys, sort=False, observed=True)["Order Status"].transform("size") > 1
+        mixed = distinct[several].groupby(keys, sort=False, observed=True)["Order Status"].agg(tuple).to_dict()
+        summary["statuses"] = [
+            mixed.get(key) or (() if pd.isna(status) else (status,))
+            for key, status in zip(summary.index, summary["Order Status"])
+        ]
+    return summary
+
+
+def hash_rows(df):
+    """Per-row content hashes of a frame and one digest over all of them (the index is ignored)"""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return row_hashes, hashlib.blake2b(row_hashes.tobytes(), digest_size=16).hexdigest()
+
+
+def partition_rows(df):
+    """
+    Row keys for a partition: its recids when they are present and unique,
+    as integers when they are all numbers (as the sheet's are)
+    """
+    if "recid" in df.columns:
+        try:
+            rows = pd.Index(df["recid"].astype("int64").to_numpy(), name="recid")
+        except (TypeError, ValueError):
+            rows = None  # not all integers
+        if rows is not None and rows.is_unique:
+            return rows
+        rows = pd.Index(df["recid"], name="recid")
+        if rows.is_unique and not rows.hasnans:
+            return rows
+    return pd.RangeIndex(len(df), name="position")
+
+
+def route(routes, order, key, present):
+    """Add or remove a partition key from an order's route"""
+    keys = routes.get(order, ())
+    if present and key not in keys:
+        routes[order] = keys + (key,)
+    elif not present and key in keys:
+        keys = tuple(k for k in keys if k != key)
+        if keys:
+            routes[order] = keys
+        else:
+            del routes[order]
+
+
+def partition_slices(df):
+    """
+    Return df stably ordered by PARTITION_COLUMN (untouched if it already is)
+    and {partition key: (start, stop)} row ranges. Missing units share the
+    "" partition with blank ones.
+    """
+    if df.empty:
+        return df, {}
+    if PARTITION_COLUMN not in df.columns:
+        return df, {"": (0, len(df))}
+
+    # One code per distinct label, so units that are equal as text (a blank
+    # and a missing unit) land in one partition instead of overwriting it
+    units = df[PARTITION_COLUMN].astype("category").cat
+    label_codes, labels = pd.factorize(np.append(units.categories.astype(str).to_numpy(dtype=object), ""))
+    codes = label_codes[units.codes.to_numpy()]  # a missing unit's code, -1, picks the trailing ""
+    if np.any(codes[1:] < codes[:-1]):
+        order = np.argsort(codes, kind="stable")
+        df = df.iloc[order].reset_index(drop=True)
+        codes = codes[order]
+
+    starts = np.flatnonzero(np.diff(codes)) + 1
+    bounds = np.concatenate([[0], starts, [len(codes)]])
+    return df, {
+        labels[codes[start]]: (int(start), int(stop))
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    }
+
+
+# -------------------------------------------------
+# BACKGROUND REFRESH (STALE-WHILE-REVALIDATE)
+# -------------------------------------------------
+class SingleFlight:
+    """
+    Run at most one call at a time. Callers that arrive while a call is in
+    flight wait for it and share its result instead of starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = None
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, fn):
+        with self._lock:
+            self.calls += 1
+            flight = self._inflight
+            leader = flight is None
+            if leader:
+                flight = self._inflight = {"done": threading.Event(), "result": None, "error": None}
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                flight["result"] = fn()
+            except Exception as e:
+                flight["error"] = e
+            finally:
+                with self._lock:
+                    self._inflight = None
+                flight["done"].set()
+        else:
+            flight["done"].wait()
+
+        if flight["error"] is not None:
+            raise flight["error"]
+        return flight["result"]
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "executions": self.executions, "coalesced": self.coalesced}
+
+
+class SnapshotStore:
+    """
+    Holds the current snapshot and reloads it on a background thread.
+    Readers always get the last published snapshot and never wait on the
+    order source, except for the very first load of the process, which
+    every waiting session shares through a single flight.
+
+    Only the worker holding the publisher lock runs the loader; the other
+    workers map each new version that it publishes. A loader result of None
+    means nothing changed, and the refresh interval adapts to how often the
+    sheet really changes.
+    """
+
+    def __init__(self, loader, interval):
+        self._loader = loader
+        self._interval = interval
+        self._publisher = PublisherLock(PUBLISHER_LOCK)
+        self._flight = SingleFlight()
+        self._wake = threading.Event()
+
+        # Warm start: serve the last saved snapshot while the sheet reloads
+        self._snapshot = load_published_snapshot("disk")
+        self._thread = threading.Thread(target=self._run, name="snapshot-refresher", daemon=True)
+        self._thread.start()
+
+    def get(self):
+        """Return the current snapshot (blocks only until the first load)"""
+        if self._snapshot is None:
+            self._refresh()
+        return self._snapshot
+
+    @property
+    def refresh_interval(self):
+        return self._interval if self._publisher.held else SHARED_POLL_INTERVAL
+
+    def load_stats(self):
+        """Counters for loader calls, actual fetches and coalesced waiters"""
+        return self._flight.stats()
+
+    def request_refresh(self):
+        """Ask the refresher thread to reload now instead of at the next tick"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._refresh()
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+
+    def _load(self):
+        if self._publisher.acquire():
+            return self._load_or_fall_back(publish=True)
+
+        manifest = read_manifest()
+        current = self._snapshot
+        if manifest is None and current is None:
+            # Nobody has published yet: load for this worker only, so it
+            # isn't left empty, and leave publishing to the lock holder
+            return self._load_or_fall_back(publish=False)
+        if manifest is None or (current is not None and current.version == manifest["version"]):
+            return None
+        return load_published_snapshot("shared", manifest=manifest, previous=current)
+
+    def _load_or_fall_back(self, publish):
+        try:
+            return self._loader(self._snapshot, publish=publish)
+        except Exception as e:
+            print(f"Order source failed: {e}")
+            current = self._snapshot
+            if current is None or current.source == "embedded":
+                return load_fallback_data(str(e))
+            # Keep serving the last good data, marked stale
+            return replace(current, error=str(e))
+
+    def _refresh(self):
+        try:
+            snapshot = self._flight.do(self._load)
+        except Exception as e:
+            print(f"Background refresh failed: {e}")
+            snapshot = None
+
+        if snapshot is None:
+            current = self._snapshot
+            if current is not None and current.stale and current.source == "live":
+                self._snapshot = replace(current, error=None)  # source is back and unchanged
+            self._interval = min(self._interval * 1.5, MAX_REFRESH_INTERVAL)
+            return
+        if snapshot.source == "live" and not snapshot.stale:
+            self._interval = max(self._interval / 2, MIN_REFRESH_INTERVAL)
+
+        current = self._snapshot
+        if current is None or SOURCE_RANK[snapshot.source] >= SOURCE_RANK[current.source]:
+            self._snapshot = snapshot  # single reference swap, atomic for readers
+
+
+@st.cache_resource
+def get_snapshot_store():
+    """One refresher per process, shared by every session"""
+    return SnapshotStore(load_data, REFRESH_INTERVAL)
+
+
 # -------------------------------------------------
 # ORDER LOOKUP LOGIC WITH INVOICE VALIDATION
 # -------------------------------------------------
-def find_order_details(order_id, invoice_account, df):
+def find_order_details(order_id, invoice_account, snapshot):
     """
     Find order details with two-factor verification:
     1. Sales Order ID must match
     2. Invoice Account ID must match
+    Both checks are dictionary probes into the order indexes of the
+    partitions holding the order, and only the matching rows are taken
+    from the shared frame.
     """
     order_clean = order_id.strip().upper()
     invoice_clean = invoice_account.strip().upper()
-    
-    # Filter by both Sales Order and Invoice Account
-    rows = df[(df["Sales order"] == order_clean) & (df["Invoice account"] == invoice_clean)]
-
-    if rows.empty:
-        # Check if order exists but invoice account doesn't match
-        order_exists = df[df["Sales order"] == order_clean]
-        if not order_exists.empty:
-            return "invalid_invoice"  # Order exists but wrong invoice account
+
+    partition_keys = snapshot.routes.get(order_clean)
+    if not partition_keys:
         return None  # Order doesn't exist at all
-    
-    return rows
+
+    matches = []
+    for key in partition_keys:
+        partition = snapshot.partitions[key]
+        row_keys = partition.order_index.get(order_clean).get(invoice_clean)
+        if row_keys is not None:
+            matches.append(partition.lines(row_keys))
+
+    if not matches:
+        return "invalid_invoice"  # Order exists but wrong invoice account
+
+    return matches[0] if len(matches) == 1 else pd.concat(matches)
+
+
+def display_value(value):
+    """Text for a cell, with missing values shown as N/A"""
+    if pd.isna(value) or value == "":
+        return "N/A"
+    return value
+
+
+def display_date(value):
+    if pd.isna(value):
+        return "N/A"
+    return value.strftime(DISPLAY_DATE_FORMAT)
+
+
+def display_naira(value):
+    if pd.isna(value):
+        return "N/A"
+    return f"₦{value:,.2f}"
 
 
-def narrate_order_details(order_df, customer_name):
+def display_date_range(first, last):
+    if pd.isna(first) or pd.isna(last) or first == last:
+        return display_date(first)
+    return f"{display_date(first)} – {display_date(last)}"
+
+
+def text_column(df, col):
+    """display_value for a whole column"""
+    if col not in df.columns:
+        return pd.Series("N/A", index=df.index)
+    text = df[col].astype("string")
+    return text.mask(text.str.strip() == "").fillna("N/A")
+
+
+def date_column(df, col):
+    """display_date for a whole column"""
+    if col not in df.columns:
+        return pd.Series("N/A", index=df.index)
+    return df[col].dt.strftime(DISPLAY_DATE_FORMAT).astype("string").fillna("N/A")
+
+
+def naira_column(df, col):
+    """display_naira for a whole column"""
+    if col not in df.columns:
+        return pd.Series("N/A", index=df.index)
+    return ("₦" + df[col].map("{:,.2f}".format, na_action="ignore").astype("string")).fillna("N/A")
+
+
+def quantity_column(df, col):
+    """Quantities for a whole column, with decimals only where needed"""
+    if col not in df.columns:
+        return pd.Series("N/A", index=df.index)
+    values = df[col]
+    whole = values.map("{:,.0f}".format, na_action="ignore").astype("string")
+    decimal = values.map("{:,.2f}".format, na_action="ignore").astype("string")
+    return whole.where(values % 1 == 0, decimal).fillna("N/A")
+
+
+def format_line_items(order_df):
+    """Line items as display strings, one column at a time"""
+    return pd.DataFrame({
+        "Line": order_df.index,
+        "Product": text_column(order_df, 'Product name'),
+        "Item Number": text_column(order_df, 'Item number'),
+        "Quantity": quantity_column(order_df, 'Quantity Order') + " " + text_column(order_df, 'Unit'),
+        "Unit Price": naira_column(order_df, 'Unit price'),
+        "Net Amount": naira_column(order_df, 'Net amount'),
+        "Requested Receipt": date_column(order_df, 'Requested receipt date'),
+        "Requested Ship": date_column(order_df, 'Requested ship date'),
+    }).reset_index(drop=True)
+
+
+def build_order_payload(summary):
     """
-    Display order details for orders with multiple line items
+    The order header narrate_order_details shows, already formatted, from
+    the order's summary row (Snapshot.order_summary). Line items are
+    fetched separately by order_lines once the header is on screen.
     """
-    # Get common order information from the first row
-    first_row = order_df.iloc[0]
-    order_id = first_row['Sales order']
-    
-    st.success(f"### Great news, {customer_name}! 🎉")
-    st.write(
-        f"I found **{len(order_df)} item(s)** for **Sales Order {order_id}**. "
+    statuses = summary['statuses']
+    return {
+        "order_id": summary['Sales order'],
+        "invoice_account": summary['Invoice account'],
+        "line_count": int(summary['line_count']),
+        "status": ", ".join(statuses) if len(statuses) > 1 else display_value(summary.get('Order Status')),
+        "delivery_date": display_date_range(summary.get('first_delivery'), summary.get('last_delivery')),
+        "ship_date": display_date_range(summary.get('first_ship'), summary.get('last_ship')),
+        "delivery_address": display_value(summary.get('Delivery address Name')),
+        "mode_of_delivery": display_value(summary.get('Mode of delivery')),
+        "delivery_terms": display_value(summary.get('Delivery terms')),
+        "total_amount": display_naira(summary.get('net_amount')),
+    }
+
+
+class OrderPayloadCache:
+    """
+    LRU cache of prepared order payloads keyed by (sales order, invoice
+    account, part), shared by every session of the process. Each entry
+    records the content hash of the order it was built from
+    (Snapshot.order_digest), so it survives refreshes that left that
+    order alone and is replaced as soon as the order itself changes.
+    A payload built from an older snapshot than the entry's is rejected.
+
+    Line-item frames vary in size, so besides the entry count the cache
+    holds at most max_rows of them, evicting the least recently used.
+    """
+
+    def __init__(self, max_entries, max_rows):
+        self._max_entries = max_entries
+        self._max_rows = max_rows
+        self._entries = OrderedDict()  # key -> (order digest, snapshot generation, payload, rows)
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.rejected = 0
+
+    def get(self, key, digest):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != digest:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, digest, generation, payload, rows=0):
+        """Store a payload; `rows` is its line-item row count, if any"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if generation < entry[1]:
+                    self.rejected += 1  # built from a snapshot that has since been replaced
+                    return
+                if entry[0] != digest:
+                    self.invalidations += 1
+                del self._entries[key]
+                self._rows -= entry[3]
+            if rows > self._max_rows:
+                return  # would flush the whole cache; served uncached
+            self._entries[key] = (digest, generation, payload, rows)
+            self._rows += rows
+            while len(self._entries) > self._max_entries:
+                self._rows -= self._entries.popitem(last=False)[1][3]
+                self.evictions += 1
+            while self._rows > self._max_rows:
+                # Headers hold no rows; drop the least recently used line items
+                oldest = next(k for k, e in self._entries.items() if e[3])
+                self._rows -= self._entries.pop(oldest)[3]
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "rows": self._rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "rejected": self.rejected,
+            }
+
+
+@st.cache_resource
+def get_order_cache():
+    """One payload cache per process, shared by every session"""
+    return OrderPayloadCache(ORDER_CACHE_SIZE, ORDER_LINES_CACHE_ROWS)
+
+
+def lookup_order(order_id, invoice_account, snapshot):
+    """
+    Two-factor check like find_order_details, answered from the order
+    summaries alone, returning the prepared header payload of a verified
+    order (cached while the order's lines are unchanged). Failed checks
+    return None or "invalid_invoice" as before.
+    """
+    order_clean = order_id.strip().upper()
+    invoice_clean = invoice_account.strip().upper()
+    digest = snapshot.order_digest(order_clean)
+    if digest is None:
+        return None  # Order doesn't exist at all
+
+    cache = get_order_cache()
+    key = (order_clean, invoice_clean, "header")
+    payload = cache.get(key, digest)
+    if payload is not None:
+        return payload
+
+    summary = snapshot.order_summary(order_clean, invoice_clean)
+    if summary is None:
+        return "invalid_invoice"
+
+    payload = build_order_payload(summary)
+    cache.put(key, digest, snapshot.generation, payload)
+    return payload
+
+
+def order_lines(payload, snapshot):
+    """
+    The line items of a verified order, numbered from 1, from the cache
+    while the order's lines are unchanged. They are formatted a page at a
+    time by line_items_view.
+    """
+    digest = snapshot.order_digest(payload['order_id'])
+    if digest is None:
+        return snapshot.df.iloc[:0]  # gone from a newer snapshot
+
+    cache = get_order_cache()
+    key = (payload['order_id'], payload['invoice_account'], "lines")
+    lines = cache.get(key, digest)
+    if lines is not None:
+        return lines
+
+    result = find_order_details(payload['order_id'], payload['invoice_account'], snapshot)
+    if not isinstance(result, pd.DataFrame):
+        result = snapshot.df.iloc[:0]
+    lines = result.reset_index(drop=True)
+    lines.index = lines.index + 1
+    cache.put(key, digest, snapshot.generation, lines, rows=len(lines))
+    return lines
+
+
+class RenderCounter:
+    """
+    Calls Streamlit elements for a render while counting the elements sent
+    and the bytes of their text or table data
+    """
+
+    def __init__(self):
+        self.elements = 0
+        self.bytes = 0
+
+    def __call__(self, element, body, **kwargs):
+        result = element(body, **kwargs)
+        self.elements += len(result) if isinstance(result, (list, tuple)) else 1
+        if isinstance(body, str):
+            self.bytes += len(body.encode())
+        elif isinstance(body, pd.DataFrame):
+            self.bytes += pa.Table.from_pandas(body, preserve_index=False).nbytes
+        return result
+
+    def stats(self):
+        return {"elements": self.elements, "bytes": self.bytes}
+
+
+def narrate_order_details(payload, snapshot, customer_name, started):
+    """
+    Display order details for orders with multiple line items. The header
+    (from build_order_payload) is drawn first and reaches the browser
+    while the line items are still being fetched. Returns the elements and
+    bytes sent (see LINE_ITEM_VIEW) and the seconds from `started`
+    (time.monotonic) to the header and to the complete order. Later page,
+    filter and sort reruns of the line items record their own counts.
+    """
+    out = RenderCounter()
+    out(st.success, f"### Great news, {customer_name}! 🎉")
+    out(
+        st.write,
+        f"I found **{payload['line_count']} item(s)** for **Sales Order {payload['order_id']}**. "
         f"Here's everything you need to know:"
     )
 
     # Display common order information
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3 = out(st.columns, 3)
 
     with col1:
-        st.write("### 📋 Order Information")
-        st.info(f"**Order Status:** {first_row['Order Status']}")
-        st.write(f"**Invoice Account:** {first_row['Invoice account']}")
-        st.write(f"**Total Items:** {len(order_df)}")
+        out(st.write, "### 📋 Order Information")
+        out(st.info, f"**Order Status:** {payload['status']}")
+        out(st.write, f"**Invoice Account:** {payload['invoice_account']}")
+        out(st.write, f"**Total Items:** {payload['line_count']}")
 
     with col2:
-        st.write("### 🚚 Delivery Details")
-        st.warning(f"**Delivery Date:** {first_row['Delivery Date']}")
-        st.write(f"**Ship Date:** {first_row['Shipping Date']}")
-        st.write(f"**Delivery Address:** {first_row['Delivery address Name']}")
+        out(st.write, "### 🚚 Delivery Details")
+        out(st.warning, f"**Delivery Date:** {payload['delivery_date']}")
+        out(st.write, f"**Ship Date:** {payload['ship_date']}")
+        out(st.write, f"**Delivery Address:** {payload['delivery_address']}")
 
     with col3:
-        st.write("### 📦 Shipping Information")
-        st.write(f"**Mode of Delivery:** {first_row['Mode of delivery']}")
-        st.write(f"**Delivery Terms:** {first_row['Delivery terms']}")
-        # Calculate total net amount across all items
-        total_amount = order_df['Net amount'].astype(float).sum()
-        st.metric("Total Net Amount", f"₦{total_amount:,.2f}")
-
-    st.markdown("---")
+        out(st.write, "### 📦 Shipping Information")
+        out(st.write, f"**Mode of Delivery:** {payload['mode_of_delivery']}")
+        out(st.write, f"**Delivery Terms:** {payload['delivery_terms']}")
+        out(st.metric, "Total Net Amount", value=payload['total_amount'])
+
+    out(st.markdown, "---")
     
     # Display each line item
-    st.write("### 📦 Order Line Items")
-    
-    for idx, (_, item) in enumerate(order_df.iterrows(), 1):
-        with st.expander(f"**Item {idx}: {item['Product name']}**", expanded=True):
-            col_a, col_b, col_c = st.columns(3)
-            
-            with col_a:
-                st.write("**Product Details**")
-                st.write(f"• Product: {item['Product name']}")
-                st.write(f"• Item Number: {item['Item number']}")
-                st.write(f"• Quantity: {item['Quantity Order']} {item['Unit']}")
-            
-            with col_b:
-                st.write("**Pricing**")
-                st.write(f"• Unit Price: ₦{float(item['Unit price']):,.2f}")
-                st.write(f"• Net Amount: ₦{float(item['Net amount']):,.2f}")
-            
-            with col_c:
-                st.write("**Dates**")
-                st.write(f"• Requested Receipt: {item['Requested receipt date']}")
-                st.write(f"• Requested Ship: {item['Requested ship date']}")
+    out(st.write, "### 📦 Order Line Items")
+    first_content = time.monotonic() - started
+
+    items = line_items_view(payload, snapshot)
+    complete = time.monotonic() - started
+    elements, sent = out.elements + items["elements"], out.bytes + items["bytes"]
+
+    print(
+        f"Rendered order {payload['order_id']} ({payload['line_count']} lines, {LINE_ITEM_VIEW}): "
+        f"{elements} elements, {sent / 1024:.1f} KB, "
+        f"header after {first_content * 1000:.0f} ms, complete after {complete * 1000:.0f} ms"
+    )
+    return {"part": "order", "elements": elements, "bytes": sent, "first_content": first_content, "complete": complete}
+
+
+def select_line_items(lines, query="", sort_by="Line order", descending=False, page=0):
+    """
+    Filter an order's lines by product or item number, sort them on the
+    raw column and cut out one page. Returns (page of lines, matching
+    count). The unfiltered, unsorted first page is a plain slice.
+    """
+    if query:
+        matches = pd.Series(False, index=lines.index)
+        for col in ("Product name", "Item number"):
+            if col in lines.columns:
+                matches |= lines[col].astype("string").str.contains(query, case=False, regex=False).fillna(False)
+        lines = lines[matches]
+
+    column = LINE_ITEM_SORTS.get(sort_by)
+    if column in lines.columns:
+        lines = lines.sort_values(column, ascending=not descending, kind="stable", na_position="last")
+    elif descending:
+        lines = lines.iloc[::-1]
+
+    start = page * LINE_ITEMS_PAGE_SIZE
+    return lines.iloc[start:start + LINE_ITEMS_PAGE_SIZE], len(lines)
+
+
+@st.fragment
+def line_items_view(payload, snapshot):
+    """
+    One page of an order's line items. Filter, sort and paging controls
+    (for orders longer than a page) rerun only this fragment. Each run
+    counts what it sends into st.session_state.last_render and returns it.
+    """
+    started = time.monotonic()
+    out = RenderCounter()
+    with st.spinner("Loading line items..."):
+        lines = order_lines(payload, snapshot)
+    key = f"items_{payload['order_id']}_{payload['invoice_account']}"
+    page_key = f"{key}_page"
+    query, sort_by, descending = "", "Line order", False
+
+    def go_to_page(page):
+        st.session_state[page_key] = page
+
+    if len(lines) > LINE_ITEMS_PAGE_SIZE:
+        filter_col, sort_col, order_col = st.columns([3, 2, 1])
+        with filter_col:
+            query = st.text_input("Filter by product or item number", key=f"{key}_query", on_change=go_to_page, args=(0,))
+        with sort_col:
+            sort_by = st.selectbox("Sort by", list(LINE_ITEM_SORTS), key=f"{key}_sort", on_change=go_to_page, args=(0,))
+        with order_col:
+            descending = st.toggle("Descending", key=f"{key}_desc", on_change=go_to_page, args=(0,))
+
+    page = st.session_state.get(page_key, 0)
+    page_lines, matching = select_line_items(lines, query.strip(), sort_by, descending, page)
+    pages = max(1, -(-matching // LINE_ITEMS_PAGE_SIZE))
+    if page >= pages:  # the filter left fewer pages than the one we were on
+        page = st.session_state[page_key] = pages - 1
+        page_lines, matching = select_line_items(lines, query.strip(), sort_by, descending, page)
+
+    items = format_line_items(page_lines)
+    if items.empty:
+        out(st.info, "No line items match that filter.")
+    elif LINE_ITEM_VIEW == "table":
+        out(st.dataframe, items, hide_index=True)
+    else:
+        for item in items.to_dict("records"):
+            with out(st.expander, f"**Item {item['Line']}: {item['Product']}**", expanded=True):
+                col_a, col_b, col_c = out(st.columns, 3)
+                
+                with col_a:
+                    out(st.write, "**Product Details**")
+                    out(st.write, f"• Product: {item['Product']}")
+                    out(st.write, f"• Item Number: {item['Item Number']}")
+                    out(st.write, f"• Quantity: {item['Quantity']}")
+                
+                with col_b:
+                    out(st.write, "**Pricing**")
+                    out(st.write, f"• Unit Price: {item['Unit Price']}")
+                    out(st.write, f"• Net Amount: {item['Net Amount']}")
+                
+                with col_c:
+                    out(st.write, "**Dates**")
+                    out(st.write, f"• Requested Receipt: {item['Requested Receipt']}")
+                    out(st.write, f"• Requested Ship: {item['Requested Ship']}")
+
+    if pages > 1:
+        prev_col, info_col, next_col = st.columns([1, 3, 1])
+        with prev_col:
+            st.button("◀ Previous", key=f"{key}_prev", disabled=page == 0, on_click=go_to_page, args=(page - 1,))
+        with info_col:
+            st.caption(f"Page {page + 1} of {pages} · {matching} of {len(lines)} line items")
+        with next_col:
+            st.button("Next ▶", key=f"{key}_next", disabled=page >= pages - 1, on_click=go_to_page, args=(page + 1,))
+
+    # A fragment rerun sends only these elements; a full run adds the header
+    seconds = time.monotonic() - started
+    st.session_state.last_render = dict(out.stats(), part="line items", first_content=seconds, complete=seconds)
+    return out.stats()
+
+
+# -------------------------------------------------
+# CONSTANT-TIME VERIFICATION
+# -------------------------------------------------
+class VerifyMeter:
+    """
+    Script-runner thread time spent verifying, shared by every session:
+    checks run, total and peak busy time, and the most checks in flight
+    at once. Waiting for the reveal time is not counted; no thread is held.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.busy_seconds = 0.0
+        self.max_busy_seconds = 0.0
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.checks += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.in_flight -= 1
+                self.busy_seconds += elapsed
+                self.max_busy_seconds = max(self.max_busy_seconds, elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "checks": self.checks,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "mean_busy": self.busy_seconds / self.checks if self.checks else 0.0,
+                "max_busy": self.max_busy_seconds,
+            }
+
+
+@st.cache_resource
+def get_verify_meter():
+    """One meter per process, shared by every session"""
+    return VerifyMeter()
+
+
+@st.fragment(run_every=VERIFY_POLL_INTERVAL)
+def await_verification(reveal_at):
+    """Show the verifying notice, then rerun the app once the answer is due"""
+    if time.monotonic() >= reveal_at:
+        st.rerun()
+    st.info("⏳ Verifying credentials and searching FMN order records...")
 
 
 # -------------------------------------------------
 # MAIN APP (3-STAGE ASSISTANT WITH SECURITY)
 # -------------------------------------------------
 def main():
+    run_started = time.monotonic()
     st.title("🤖 FMN Order Status Assistant AI")
     st.write("Your virtual FMN support agent for instant order verification and delivery insights — powered by a smart order-intelligence engine designed to simplify customer experience.")
 
@@ -268,9 +2197,19 @@ def main():
     if check_timeout():
         return
 
-    df = load_data()
+    store = get_snapshot_store()
+    snapshot = store.get()
+    if snapshot is None:
+        st.error("Could not load any data.")
+        return
 
-    if df.empty:
+    if snapshot.source == "embedded":
+        st.error(f"{get_order_source().label} connection failed: {snapshot.error}")
+        st.warning("Using embedded fallback data — Google Sheet not connected yet.")
+    elif snapshot.stale:
+        st.warning(f"{get_order_source().label} is unreachable — showing orders as of {snapshot.loaded_at:%d %b %Y %H:%M}.")
+
+    if snapshot.df.empty:
         st.error("Could not load any data.")
         return
 
@@ -278,8 +2217,66 @@ def main():
     with st.sidebar:
         st.header("Settings")
         if st.button("🔄 Refresh Data"):
-            load_data.clear()
-            st.rerun()
+            store.request_refresh()
+            st.toast("Refreshing order data in the background...")
+        st.caption(f"Data as of {snapshot.loaded_at:%H:%M:%S}")
+
+        with st.expander("📊 Data stats"):
+            load_stats = store.load_stats()
+            st.caption(
+                f"Data loads: {load_stats['executions']} fetched, "
+                f"{load_stats['coalesced']} coalesced"
+            )
+            st.caption(f"Checking for changes every {store.refresh_interval:.0f}s")
+            if isinstance(get_order_source(), GoogleSheetSource):
+                guard_stats = get_sheets_guard().stats()
+                st.caption(
+                    f"Sheets: {guard_stats['retries']} retries, {guard_stats['trips']} breaker trips, "
+                    f"circuit {guard_stats['state']}"
+                )
+            age_minutes = (datetime.now() - snapshot.loaded_at).total_seconds() / 60
+            st.caption(f"Snapshot age {age_minutes:.0f} min" + (" (stale)" if snapshot.stale else ""))
+            memory = f"{snapshot.stats.get('memory_bytes', 0) / 1e6:.1f} MB"
+            if "raw_bytes" in snapshot.stats:
+                memory += f" (raw rows read {snapshot.stats['raw_bytes'] / 1e6:.1f} MB)"
+            st.caption(
+                f"Snapshot v{snapshot.version}: {len(snapshot.df)} lines in "
+                f"{len(snapshot.partitions)} partitions, {memory}"
+            )
+            st.caption(
+                f"Last index update: {snapshot.stats.get('partitions_rebuilt', 0)} partitions rebuilt, "
+                f"{snapshot.stats.get('index_rows_applied', 0)} lines applied"
+            )
+            verify_stats = get_verify_meter().stats()
+            st.caption(
+                f"Verification: {verify_stats['checks']} checks, thread busy "
+                f"{verify_stats['mean_busy'] * 1000:.0f} ms avg / {verify_stats['max_busy'] * 1000:.0f} ms max, "
+                f"{verify_stats['in_flight']} running (peak {verify_stats['peak_in_flight']})"
+            )
+            last_render = st.session_state.last_render
+            if last_render and last_render.get("part") == "line items":
+                st.caption(
+                    f"Last line-item rerun sent {last_render['elements']} elements, "
+                    f"{last_render['bytes'] / 1024:.1f} KB in {last_render['complete']:.2f}s"
+                )
+            elif last_render:
+                st.caption(
+                    f"Last order rendered with {last_render['elements']} elements, "
+                    f"{last_render['bytes'] / 1024:.1f} KB; header after "
+                    f"{last_render['first_content']:.2f}s, complete after {last_render['complete']:.2f}s"
+                )
+            cache_stats = get_order_cache().stats()
+            st.caption(
+                f"Order cache: {cache_stats['entries']}/{ORDER_CACHE_SIZE} entries, "
+                f"{cache_stats['rows']:,}/{ORDER_LINES_CACHE_ROWS:,} line rows, "
+                f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                f"{cache_stats['evictions']} evicted, {cache_stats['invalidations']} invalidated, "
+                f"{cache_stats['rejected']} rejected"
+            )
+            if "fetch" in snapshot.stats:
+                st.caption(f"Last fetch: {describe_fetch(snapshot.stats['fetch'])}")
+                for name, seconds in snapshot.stats["fetch"].get("sources", {}).items():
+                    st.caption(f"• {name}: {seconds:.2f}s")
         
         if st.session_state.customer_name:
             st.info(f"👤 Logged in as: **{st.session_state.customer_name}**")
@@ -359,6 +2356,8 @@ def main():
         if back:
             st.session_state.stage = "order"
             st.session_state.attempts = 0
+            st.session_state.pending_verification = None
+            st.session_state.verified_order = None
             st.rerun()
 
         if verify:
@@ -369,41 +2368,69 @@ def main():
             # Clean the invoice account input: uppercase and trim spaces
             invoice_clean = invoice_account.strip().upper()
 
-            with st.spinner("Verifying credentials and searching FMN order records..."):
-                time.sleep(1.5)
-                result = find_order_details(st.session_state.order_id, invoice_clean, df)
+            # The answer is shown VERIFY_RESPONSE_TIME after the click whatever
+            # it is, so timing can't tell a wrong invoice from a missing order;
+            # the wait happens between reruns, not in a sleeping thread
+            with get_verify_meter().track():
+                result = lookup_order(st.session_state.order_id, invoice_clean, snapshot)
+            st.session_state.verified_order = None
+            st.session_state.pending_verification = {
+                "result": result,
+                "clicked_at": run_started,
+                "reveal_at": run_started + VERIFY_RESPONSE_TIME,
+            }
 
-            if isinstance(result, pd.DataFrame):
-                # Successfully found and validated order
-                st.session_state.attempts = 0  # Reset attempts on success
-                narrate_order_details(result, st.session_state.customer_name)
-                
-                # Option to check another order
-                st.markdown("---")
-                if st.button("Check Another Order"):
-                    st.session_state.stage = "order"
-                    st.session_state.order_id = ""
-                    st.rerun()
-                    
-            elif result == "invalid_invoice":
-                st.session_state.attempts += 1
+        pending = st.session_state.pending_verification
+        if pending is None:
+            shown = st.session_state.verified_order  # stays on screen across reruns
+            if shown is None:
+                return
+            result = lookup_order(shown['order_id'], shown['invoice_account'], snapshot)
+            if not isinstance(result, dict):
+                result = shown
+            started = run_started
+        elif time.monotonic() < pending["reveal_at"]:
+            await_verification(pending["reveal_at"])
+            return
+        else:
+            st.session_state.pending_verification = None
+            result = pending["result"]
+            started = pending["clicked_at"]  # the customer has been waiting since the click
+
+        if isinstance(result, dict):
+            # Successfully found and validated order
+            st.session_state.attempts = 0  # Reset attempts on success
+            st.session_state.verified_order = result
+            st.session_state.last_render = narrate_order_details(
+                result, snapshot, st.session_state.customer_name, started
+            )
+            
+            # Option to check another order
+            st.markdown("---")
+            if st.button("Check Another Order"):
+                st.session_state.stage = "order"
+                st.session_state.order_id = ""
+                st.session_state.verified_order = None
+                st.rerun()
                 
-                # Block user if max attempts reached
-                if st.session_state.attempts >= MAX_ATTEMPTS:
-                    st.session_state.blocked_until = datetime.now() + timedelta(minutes=5)
-                    st.error(f"🚫 Maximum verification attempts ({MAX_ATTEMPTS}) exceeded. Account locked for 5 minutes for security.")
-                else:
-                    st.error(f"❌ **Invoice Account Mismatch!** The Invoice Account ID you entered doesn't match our records for Sales Order **{st.session_state.order_id}**. Please double-check and try again.")
-                    st.warning("💡 **Tip:** Make sure you're entering the correct Invoice Account ID associated with this order.")
+        elif result == "invalid_invoice":
+            st.session_state.attempts += 1
+            
+            # Block user if max attempts reached
+            if st.session_state.attempts >= MAX_ATTEMPTS:
+                st.session_state.blocked_until = datetime.now() + timedelta(minutes=5)
+                st.error(f"🚫 Maximum verification attempts ({MAX_ATTEMPTS}) exceeded. Account locked for 5 minutes for security.")
             else:
-                st.session_state.attempts += 1
-                
-                if st.session_state.attempts >= MAX_ATTEMPTS:
-                    st.session_state.blocked_until = datetime.now() + timedelta(minutes=5)
-                    st.error(f"🚫 Maximum verification attempts ({MAX_ATTEMPTS}) exceeded. Account locked for 5 minutes for security.")
-                else:
-                    st.error(f"❌ No order found for ID **{st.session_state.order_id}**. Please check the order number and try again.")
-
+                st.error(f"❌ **Invoice Account Mismatch!** The Invoice Account ID you entered doesn't match our records for Sales Order **{st.session_state.order_id}**. Please double-check and try again.")
+                st.warning("💡 **Tip:** Make sure you're entering the correct Invoice Account ID associated with this order.")
+        else:
+            st.session_state.attempts += 1
+            
+            if st.session_state.attempts >= MAX_ATTEMPTS:
+                st.session_state.blocked_until = datetime.now() + timedelta(minutes=5)
+                st.error(f"🚫 Maximum verification attempts ({MAX_ATTEMPTS}) exceeded. Account locked for 5 minutes for security.")
+            else:
+                st.error(f"❌ No order found for ID **{st.session_state.order_id}**. Please check the order number and try again.")
 
 if __name__ == "__main__":
     main()
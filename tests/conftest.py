@@ -0,0 +1,94 @@
+import os
+import re
+import sys
+
+import pytest
+from gspread.utils import a1_to_rowcol
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+HEADER = [
+    "recid", "Sales order", "Inventory Unit", "Order Status", "Delivery Date",
+    "Invoice account", "Delivery address Name", "Mode of delivery", "Delivery terms",
+    "Item number", "Net amount", "Product name", "Quantity Order",
+    "Requested receipt date", "Requested ship date", "Unit price", "Unit",
+    "Shipping Date", "modifieddatetime",
+]
+
+
+def make_row(i, unit=None, modified="11/4/25 17:39"):
+    """One sheet row as the API returns it (all cells are text)"""
+    return [
+        str(1000 + i), f"SAP{i // 3:07d}", unit or ("fzap" if i % 2 else "fmbl"), "Open Order",
+        "11/4/25 0:00", f"C{i // 3:05d}-B0", "HONEYWELL", "Self -30 T", "Ex works",
+        f"P{i:06d}", f"{i * 10.5}", "WHEAT", "35000", "11/4/25 0:00", "11/4/25 0:00",
+        "697360.78", "T", "11/4/25 0:00", modified,
+    ]
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.modified = "t0"
+
+    def get_lastUpdateTime(self):
+        return self.modified
+
+
+class FakeWorksheet:
+    """
+    Enough of a gspread Worksheet for the sync code. Like the Sheets API,
+    range reads drop trailing blank rows and trailing blank cells.
+    """
+
+    def __init__(self, rows, row_count=1000):
+        self.rows = rows
+        self.row_count = row_count
+        self.spreadsheet = FakeSpreadsheet()
+        self.calls = []
+        self.batches = []  # ranges per batch_get
+
+    def row_values(self, row):
+        return list(HEADER)
+
+    def _grid(self, rng):
+        m = re.match(r"([A-Z]+)(\d+):([A-Z]+)(\d*)$", rng)
+        first_col = a1_to_rowcol(f"{m.group(1)}1")[1]
+        last_col = a1_to_rowcol(f"{m.group(3)}1")[1]
+        first_row = int(m.group(2))
+        last_row = int(m.group(4)) if m.group(4) else len(self.rows) + 1
+        grid = [list(HEADER)] + [list(row) for row in self.rows]
+        block = [row[first_col - 1:last_col] for row in grid[first_row - 1:last_row]]
+        while block and not any(block[-1]):
+            block.pop()
+        return block
+
+    def get(self, rng, major_dimension=None, **kwargs):
+        self.calls.append(rng)
+        block = self._grid(rng)
+        if major_dimension != "COLUMNS":
+            return block
+        columns = [list(col) for col in zip(*block)] if block else []
+        for col in columns:
+            while col and col[-1] == "":
+                col.pop()
+        while columns and not columns[-1]:
+            columns.pop()
+        return columns
+
+    def batch_get(self, ranges, **kwargs):
+        self.batches.append(len(ranges))
+        return [self._grid(rng) for rng in ranges]
+
+
+@pytest.fixture
+def sync_state():
+    """A fresh sync state, not the process-wide cached one"""
+    return app.get_sync_state.__wrapped__(None, "test")
+
+
+def snapshot_from_rows(rows, previous=None):
+    """A prepared Snapshot of sheet rows, as load_data would build it"""
+    df = app.values_to_frame([list(col) for col in zip(*rows)], HEADER)
+    return app.prepare_snapshot(df, "live", app.datetime.now(), previous=previous)
@@ -0,0 +1,75 @@
+from conftest import FakeWorksheet, make_row
+
+import app
+
+
+def synced_sheet(sync_state, count=100):
+    rows = [make_row(i, modified="11/4/25 10:00") for i in range(count)]
+    rows[0][18] = "11/4/25 17:39"  # the high-water mark
+    sheet = FakeWorksheet(rows)
+    app._sync_rows(sheet, sync_state)
+    return rows, sheet
+
+
+def test_modified_and_new_rows_are_upserted(sync_state):
+    rows, sheet = synced_sheet(sync_state)
+    rows[3][3] = "Delivered"
+    rows[3][18] = "12/4/25 9:00"
+    rows.append(make_row(100, modified="12/4/25 9:05"))
+
+    df = app._sync_rows(sheet, sync_state)
+
+    assert sync_state["last_fetch"]["mode"] == "delta"
+    assert len(df) == 101
+    assert df.loc[3, "Order Status"] == "Delivered"
+    assert df["recid"].astype(str).iloc[-1] == "1100"
+    assert sync_state["high_water"] == app.parse_sheet_datetimes(["12/4/25 9:05"])[0]
+
+
+def test_deleted_rows_drop_out_in_sheet_order(sync_state):
+    rows, sheet = synced_sheet(sync_state)
+    del rows[10]
+    rows[20][18] = "12/4/25 9:00"
+
+    df = app._sync_rows(sheet, sync_state)
+
+    recids = df["recid"].astype(str).tolist()
+    assert sync_state["last_fetch"]["mode"] == "delta"
+    assert "1010" not in recids
+    assert recids == [row[0] for row in rows]
+
+
+def test_duplicate_recids_fall_back_to_a_full_download(sync_state):
+    rows, sheet = synced_sheet(sync_state)
+    rows[5][0] = rows[6][0]
+
+    df = app._sync_rows(sheet, sync_state)
+
+    assert sync_state["last_fetch"]["mode"] != "delta"
+    assert len(df) == 100
+
+
+def test_scattered_changes_are_fetched_in_bounded_batches(monkeypatch, sync_state):
+    monkeypatch.setattr(app, "DELTA_RANGES_PER_REQUEST", 4)
+    rows, sheet = synced_sheet(sync_state)
+    for i in range(1, 20, 2):  # ten separate runs
+        rows[i][3] = "Delivered"
+        rows[i][18] = "12/4/25 9:00"
+    sheet.batches.clear()
+
+    df = app._sync_rows(sheet, sync_state)
+
+    assert sync_state["last_fetch"]["mode"] == "delta"
+    assert sheet.batches[1:] == [4, 4, 2]  # after the recid/modified column read
+    assert (df.loc[1:19:2, "Order Status"] == "Delivered").all()
+
+
+def test_too_many_separate_runs_fall_back_to_a_full_download(monkeypatch, sync_state):
+    monkeypatch.setattr(app, "DELTA_MAX_RANGES", 5)
+    rows, sheet = synced_sheet(sync_state)
+    for i in range(1, 20, 2):
+        rows[i][18] = "12/4/25 9:00"
+
+    app._sync_rows(sheet, sync_state)
+
+    assert sync_state["last_fetch"]["mode"] != "delta"
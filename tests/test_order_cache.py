@@ -0,0 +1,72 @@
+import pytest
+from conftest import make_row, snapshot_from_rows
+
+import app
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = app.OrderPayloadCache(8, 100)
+    monkeypatch.setattr(app, "get_order_cache", lambda: cache)
+    return cache
+
+
+def test_refresh_that_changes_another_order_keeps_the_cached_payload(cache):
+    rows = [make_row(i) for i in range(12)]
+    first = snapshot_from_rows(rows)
+    payload = app.lookup_order("SAP0000001", "C00001-B0", first)
+
+    rows[0][10] = "99"  # a line of SAP0000000
+    second = snapshot_from_rows(rows, previous=first)
+
+    assert app.lookup_order("SAP0000001", "C00001-B0", second) is payload
+    assert cache.stats()["hits"] == 1
+
+
+def test_changed_order_is_rebuilt(cache):
+    rows = [make_row(i) for i in range(12)]
+    first = snapshot_from_rows(rows)
+    assert app.lookup_order("SAP0000001", "C00001-B0", first)["status"] == "Open Order"
+
+    rows[3][3] = "Delivered"
+    rows[4][3] = rows[5][3] = "Delivered"
+    second = snapshot_from_rows(rows, previous=first)
+
+    assert app.lookup_order("SAP0000001", "C00001-B0", second)["status"] == "Delivered"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_payload_from_an_older_snapshot_is_rejected(cache):
+    rows = [make_row(i) for i in range(6)]
+    old = snapshot_from_rows(rows)
+    for row in rows[:3]:
+        row[3] = "Delivered"
+    new = snapshot_from_rows(rows, previous=old)
+
+    app.lookup_order("SAP0000000", "C00000-B0", new)
+    app.lookup_order("SAP0000000", "C00000-B0", old)
+
+    assert cache.stats()["rejected"] == 1
+    assert app.lookup_order("SAP0000000", "C00000-B0", new)["status"] == "Delivered"
+
+
+def test_failed_checks_are_not_cached(cache):
+    snapshot = snapshot_from_rows([make_row(i) for i in range(6)])
+
+    assert app.lookup_order("SAP0000000", "WRONG", snapshot) == "invalid_invoice"
+    assert app.lookup_order("NOPE", "C00000-B0", snapshot) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_line_items_are_bounded_by_rows():
+    cache = app.OrderPayloadCache(100, 10)
+    cache.put(("A", "X", "header"), "a", 1, {})
+    cache.put(("A", "X", "lines"), "a", 1, "six rows", rows=6)
+    cache.put(("B", "X", "lines"), "b", 1, "six rows", rows=6)  # evicts A's lines
+    cache.put(("C", "X", "lines"), "c", 1, "too big", rows=11)  # not cached
+
+    assert cache.get(("A", "X", "lines"), "a") is None
+    assert cache.get(("A", "X", "header"), "a") == {}
+    assert cache.get(("C", "X", "lines"), "c") is None
+    assert cache.stats()["rows"] == 6
+    assert cache.stats()["evictions"] == 1
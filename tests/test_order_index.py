@@ -0,0 +1,73 @@
+import numpy as np
+from conftest import HEADER, make_row, snapshot_from_rows
+
+import app
+
+
+def index_contents(snapshot):
+    return {
+        key: {order: {inv: sorted(rows.tolist()) for inv, rows in partition.order_index.get(order).items()}
+              for order in partition.order_index}
+        for key, partition in snapshot.partitions.items()
+    }
+
+
+def test_updated_indexes_match_a_rebuild():
+    rows = [make_row(i) for i in range(30)]
+    first = snapshot_from_rows(rows)
+
+    rows[4][1], rows[4][5] = "SAP0000009", "C00009-B0"  # line moves to another order
+    del rows[7]  # line deleted
+    rows.append(make_row(30))  # new order
+    rows[2][2] = "fzap"  # line moves to the other unit
+    second = snapshot_from_rows(rows, previous=first)
+    rebuilt = snapshot_from_rows(rows)
+
+    assert second.stats["partitions_updated"] == 2
+    assert index_contents(second) == index_contents(rebuilt)
+    assert {order: sorted(keys) for order, keys in second.routes.items()} == {
+        order: sorted(keys) for order, keys in rebuilt.routes.items()
+    }
+
+
+def test_unchanged_partition_keeps_its_index():
+    rows = [make_row(i) for i in range(12)]
+    first = snapshot_from_rows(rows)
+    rows[1][3] = "Delivered"  # fzap only
+    second = snapshot_from_rows(rows, previous=first)
+
+    assert second.partitions["fmbl"].order_index is first.partitions["fmbl"].order_index
+    assert second.partitions["fzap"].order_index is not first.partitions["fzap"].order_index
+
+
+def test_apply_leaves_the_old_index_untouched():
+    index = app.OrderIndex({"A": {"X": np.array([1, 2])}})
+
+    updated, added, removed = index.apply(upserts=[(3, "B", "X")], deletes=[(1, "A", "X"), (2, "A", "X")])
+
+    assert index.get("A")["X"].tolist() == [1, 2]
+    assert updated.get("A") is None and updated.get("B")["X"].tolist() == [3]
+    assert (added, removed) == (["B"], ["A"])
+
+
+def test_index_keys_are_integer_recids_or_positions():
+    rows = [make_row(i) for i in range(6)]
+    snapshot = snapshot_from_rows(rows)
+    assert snapshot.partitions["fmbl"].rows.dtype == "int64"
+
+    rows[1][0] = "not-a-number"
+    assert snapshot_from_rows(rows).partitions["fzap"].rows.name == "recid"
+
+    rows[3][0] = rows[5][0]
+    assert snapshot_from_rows(rows).partitions["fzap"].rows.name == "position"
+
+
+def test_blank_and_missing_units_share_one_partition():
+    rows = [make_row(0, unit="fzap"), make_row(3), make_row(6)]
+    df = app.values_to_frame([list(col) for col in zip(*rows)], HEADER)
+    df["Inventory Unit"] = ["fzap", "", None]
+    snapshot = app.prepare_snapshot(df, "live", app.datetime.now())
+
+    assert sorted(snapshot.partitions) == ["", "fzap"]
+    assert len(app.find_order_details("SAP0000001", "C00001-B0", snapshot)) == 1
+    assert len(app.find_order_details("SAP0000002", "C00002-B0", snapshot)) == 1
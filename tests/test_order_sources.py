@@ -0,0 +1,84 @@
+import pytest
+from conftest import FakeWorksheet, make_row
+
+import app
+
+
+class FakeConnection:
+    def __init__(self, sheets):
+        self.sheets = sheets
+
+    def worksheet(self, spreadsheet_key=None, title=None):
+        return self.sheets[(spreadsheet_key, title)]
+
+    def reset(self):
+        pass
+
+
+@pytest.fixture
+def sheets(monkeypatch):
+    """Fake worksheets served through a fresh connection, sync state and guard"""
+    app.get_sync_state.clear()
+    app.get_sheets_guard.clear()
+    sheets = {}
+    monkeypatch.setattr(app, "get_sheets_connection", lambda: FakeConnection(sheets))
+    yield sheets
+    app.get_sync_state.clear()
+    app.get_sheets_guard.clear()
+
+
+def test_single_sheet_reports_last_fetch(sheets):
+    sheets[(None, None)] = FakeWorksheet([make_row(i) for i in range(6)])
+    source = app.GoogleSheetSource()
+
+    df = source.fetch()
+
+    assert len(df) == 6
+    assert source.last_fetch["mode"] == app.SHEET_FETCH_MODE
+    assert "seconds" in source.last_fetch
+
+
+def test_failed_multi_tab_load_counts_once_towards_the_breaker(sheets):
+    tabs = ["a", "b", "c", "d"]
+    for tab in tabs:
+        sheets[(None, tab)] = FakeWorksheet([make_row(i) for i in range(3)])
+        sheets[(None, tab)].row_values = broken_row_values
+    source = app.GoogleSheetSource(tabs)
+    guard = app.get_sheets_guard()
+
+    for load in range(app.BREAKER_FAILURE_THRESHOLD):
+        assert guard.state == "closed"
+        with pytest.raises(RuntimeError):
+            source.fetch()
+        assert guard.failures == load + 1
+
+    assert guard.state == "open"
+    assert guard.stats()["trips"] == 1
+    with pytest.raises(app.CircuitOpenError):
+        source.fetch()
+
+
+def test_same_tab_title_in_two_spreadsheets_syncs_separately(sheets):
+    sheets[("key-a", "2025")] = FakeWorksheet([make_row(i) for i in range(3)])
+    sheets[("key-b", "2025")] = FakeWorksheet([make_row(i) for i in range(10, 14)])
+    source = app.GoogleSheetSource([
+        {"spreadsheet_key": "key-a", "worksheet": "2025"},
+        {"spreadsheet_key": "key-b", "worksheet": "2025"},
+    ])
+
+    df = source.fetch()
+
+    assert df.groupby("Source").size().to_dict() == {"key-a / 2025": 3, "key-b / 2025": 4}
+    assert source.fetch() is None  # both unchanged: no download
+
+
+def test_duplicate_tab_names_are_rejected():
+    with pytest.raises(ValueError):
+        app.GoogleSheetSource([
+            {"name": "2025", "spreadsheet_key": "key-a", "worksheet": "2025"},
+            {"name": "2025", "spreadsheet_key": "key-b", "worksheet": "2025"},
+        ])
+
+
+def broken_row_values(row):
+    raise RuntimeError("sheet unreadable")
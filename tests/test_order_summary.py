@@ -0,0 +1,18 @@
+from conftest import HEADER, make_row
+
+import app
+
+
+def test_order_across_units_without_quantity_column():
+    rows = [make_row(i) for i in range(6)]
+    header = [col for col in HEADER if col not in ("Quantity Order", "Shipping Date")]
+    rows = [[value for col, value in zip(HEADER, row) if col in header] for row in rows]
+    df = app.values_to_frame([list(col) for col in zip(*rows)], header)
+    snapshot = app.prepare_snapshot(df, "live", app.datetime.now())
+
+    summary = snapshot.order_summary("SAP0000000", "C00000-B0")
+
+    assert len(snapshot.routes["SAP0000000"]) == 2  # rows alternate fmbl/fzap
+    assert summary["line_count"] == 3
+    assert summary["net_amount"] == 31.5
+    assert "quantity" not in summary and "first_ship" not in summary
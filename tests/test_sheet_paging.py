@@ -0,0 +1,61 @@
+from conftest import FakeWorksheet, HEADER, make_row
+
+import app
+
+
+def test_blank_row_at_page_boundary_keeps_later_rows(monkeypatch, sync_state):
+    monkeypatch.setattr(app, "PAGE_ROWS", 7)
+    rows = [make_row(i) for i in range(19)]
+    rows.insert(6, [""] * len(HEADER))  # sheet row 8, the last row of the first page
+    sheet = FakeWorksheet(rows)
+
+    df = app.fetch_pages(sheet, HEADER, sync_state)
+
+    assert df["recid"].astype(str).tolist() == [str(1000 + i) for i in range(19)]
+
+
+def test_paging_stops_at_the_last_data_row(monkeypatch, sync_state):
+    monkeypatch.setattr(app, "PAGE_ROWS", 5)
+    sheet = FakeWorksheet([make_row(i) for i in range(12)], row_count=1000)
+
+    df = app.fetch_pages(sheet, HEADER, sync_state)
+
+    assert len(df) == 12
+    page_reads = [rng for rng in sheet.calls if not rng.startswith("A2:A")]
+    assert len(page_reads) == 3
+
+
+def test_failed_page_resumes_from_next_page(monkeypatch, sync_state):
+    monkeypatch.setattr(app, "PAGE_ROWS", 4)
+    sheet = FakeWorksheet([make_row(i) for i in range(10)])
+    real_get = sheet.get
+
+    def flaky_get(rng, **kwargs):
+        if rng.startswith("A6:"):
+            raise RuntimeError("503")
+        return real_get(rng, **kwargs)
+
+    monkeypatch.setattr(sheet, "get", flaky_get)
+    try:
+        app.fetch_pages(sheet, HEADER, sync_state)
+    except RuntimeError:
+        pass
+    monkeypatch.setattr(sheet, "get", real_get)
+    sheet.calls.clear()
+
+    df = app.fetch_pages(sheet, HEADER, sync_state)
+
+    assert len(df) == 10
+    assert sheet.calls[0].startswith("A6:")
+
+
+def test_raw_bytes_measure_the_downloaded_text(monkeypatch, sync_state):
+    monkeypatch.setattr(app, "PAGE_ROWS", 5)
+    rows = [make_row(i) for i in range(12)]
+    sheet = FakeWorksheet(rows)
+
+    df = app.fetch_pages(sheet, list(HEADER), sync_state)
+
+    text = app.values_to_frame([list(col) for col in zip(*rows)], HEADER)
+    assert sync_state["raw_bytes"] == text.memory_usage(index=False, deep=True).sum()
+    assert sync_state["raw_bytes"] != df.memory_usage(deep=True).sum()
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+from conftest import make_row, snapshot_from_rows
+
+import app
+
+
+@pytest.fixture
+def snapshot_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(app, "SNAPSHOT_MANIFEST", str(tmp_path / "orders.json"))
+    monkeypatch.setattr(app, "PUBLISHER_LOCK", str(tmp_path / "publisher.lock"))
+    return tmp_path
+
+
+def test_worker_without_the_lock_does_not_publish(snapshot_dir):
+    held = app.PublisherLock(app.PUBLISHER_LOCK)
+    assert held.acquire()  # another worker is the publisher
+    calls = []
+
+    def loader(previous, publish):
+        calls.append(publish)
+        return snapshot_from_rows([make_row(i) for i in range(3)])
+
+    store = app.SnapshotStore(loader, 999)
+
+    assert store.get().source == "live"
+    assert calls == [False]
+    assert app.read_manifest() is None
+
+
+def test_publish_leaves_only_the_snapshot_and_manifest(snapshot_dir):
+    snapshot = snapshot_from_rows([make_row(i) for i in range(3)])
+
+    assert app.publish_snapshot(snapshot.df, "digest") == 1
+    assert sorted(os.listdir(snapshot_dir)) == ["orders-1.arrow", "orders.json"]
+    assert app.read_manifest()["content_digest"] == "digest"
+
+
+def test_unchanged_checks_keep_polling_at_the_refresh_interval(snapshot_dir):
+    snapshot = snapshot_from_rows([make_row(i) for i in range(3)])
+    store = app.SnapshotStore(lambda previous, publish: snapshot if previous is None else None, 60)
+    store.get()
+
+    for _ in range(20):
+        store._refresh()
+
+    assert store.refresh_interval == app.REFRESH_INTERVAL